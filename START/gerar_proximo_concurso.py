@@ -24,7 +24,7 @@ except Exception:
     DB_PATH = ROOT / "data" / "BD" / "dia_de_sorte.db"
 
 from config.game import DIA_DE_SORTE_RULES, MESES_SORTE
-from data.BD.connection import get_conn
+from data.BD.connection import close_conn, get_conn
 from training.core.brain_hub import BrainHub
 
 
@@ -879,7 +879,7 @@ def main() -> None:
             )
     finally:
         try:
-            conn.close()
+            close_conn(conn)
         except Exception:
             pass
 
@@ -24,22 +24,40 @@ def _resolve_db_path(db_path: str | None) -> Path:
     return path
 
 
-def get_conn(db_path: str | None = None) -> sqlite3.Connection:
+def get_conn(db_path: str | None = None, cache_mb: int = 64) -> sqlite3.Connection:
     path = _resolve_db_path(db_path)
     path.parent.mkdir(parents=True, exist_ok=True)
 
-    # timeout ajuda em runs longos com muitas escritas
-    conn = sqlite3.connect(str(path), timeout=60)
+    # timeout ajuda em runs longos com muitas escritas;
+    # cached_statements maior: trainer/backtest reusam dezenas de SQLs fixos
+    conn = sqlite3.connect(str(path), timeout=60, cached_statements=256)
 
     # Pragmas de performance/segurança (com fallback)
     conn.execute("PRAGMA foreign_keys=ON;")
     conn.execute("PRAGMA synchronous=NORMAL;")
     conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute(f"PRAGMA cache_size=-{int(cache_mb) * 1024};")  # page cache em KiB (padrão ~64 MB)
 
     # WAL é ótimo, mas pode falhar em alguns FS/ambientes -> fallback seguro
     try:
         conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA wal_autocheckpoint=1000;")
     except sqlite3.OperationalError:
         conn.execute("PRAGMA journal_mode=DELETE;")
 
+    # mmap acelera leituras; alguns builds/FS não suportam -> ignora
+    try:
+        conn.execute("PRAGMA mmap_size=268435456;")
+    except sqlite3.OperationalError:
+        pass
+
     return conn
+
+
+def close_conn(conn: sqlite3.Connection) -> None:
+    # PRAGMA optimize no fechamento: atualiza estatísticas do planner quando vale a pena
+    try:
+        conn.execute("PRAGMA optimize;")
+    except sqlite3.Error:
+        pass
+    conn.close()
@@ -105,11 +105,20 @@ CREATE TABLE IF NOT EXISTS cerebros (
 -- =====================================================
 CREATE TABLE IF NOT EXISTS cerebro_estado (
     cerebro_id INTEGER PRIMARY KEY,
-    estado_json TEXT NOT NULL,
+    estado_json BLOB NOT NULL,  -- JSON texto ou JSONB (IA_STATE_JSONB=1)
     atualizado_em TEXT,
     FOREIGN KEY (cerebro_id) REFERENCES cerebros(id)
 );
 
+-- estado em linhas (chave -> valor) para partes que mudam pouco por vez
+CREATE TABLE IF NOT EXISTS cerebro_estado_kv (
+    cerebro_id INTEGER NOT NULL,
+    chave TEXT NOT NULL,
+    valor INTEGER NOT NULL,
+    PRIMARY KEY (cerebro_id, chave),
+    FOREIGN KEY (cerebro_id) REFERENCES cerebros(id)
+);
+
 -- =====================================================
 -- 08) PERFORMANCE DO CÉREBRO POR CONCURSO
 -- =====================================================
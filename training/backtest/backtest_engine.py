@@ -19,7 +19,7 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from config.game import DIA_DE_SORTE_RULES
-from data.BD.connection import get_conn
+from data.BD.connection import close_conn, get_conn
 from training.core.brain_hub import BrainHub
 from training.utils.comparador import contar_acertos
 
@@ -637,7 +637,7 @@ def main() -> None:
 
     finally:
         try:
-            conn.close()
+            close_conn(conn)
         except Exception:
             pass
 
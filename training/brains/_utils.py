@@ -3,16 +3,20 @@ from __future__ import annotations
 import random
 from typing import Dict, List, Sequence
 
+import numpy as np
+
 from config.game import DIA_DE_SORTE_RULES
 
-UNIVERSO = DIA_DE_SORTE_RULES.universo
+# tupla imutável: dispensa cópias defensivas (UNIVERSO[:]) nos cérebros
+UNIVERSO = tuple(DIA_DE_SORTE_RULES.universo)
 UNIVERSO_MAX = DIA_DE_SORTE_RULES.universo_max
+UNIVERSO_ARR = np.asarray(UNIVERSO, dtype=np.int64)
 GRID_COLS = DIA_DE_SORTE_RULES.grid_cols
 GRID_ROWS = DIA_DE_SORTE_RULES.grid_rows
 
 def weighted_sample_without_replacement(weights: Dict[int, float], k: int) -> List[int]:
     # método simples e leve: amostra repetida sem reposição
-    pool = UNIVERSO[:]
+    pool = list(UNIVERSO)
     result = []
     for _ in range(k):
         w = [max(0.0001, float(weights.get(x, 0.001))) for x in pool]
@@ -21,6 +25,17 @@ def weighted_sample_without_replacement(weights: Dict[int, float], k: int) -> Li
         pool.remove(pick)
     return sorted(result)
 
+def np_rng() -> np.random.Generator:
+    # gerador NumPy semeado pelo random global (mantém reprodutível com random.seed)
+    return np.random.default_rng(random.getrandbits(64))
+
+def dezenas_mask(jogo: Sequence[int]) -> int:
+    # bit d ligado = dezena d presente (universo <= 31 cabe em 32 bits)
+    mask = 0
+    for d in jogo:
+        mask |= 1 << int(d)
+    return mask
+
 def count_even(jogo: List[int]) -> int:
     return sum(1 for x in jogo if x % 2 == 0)
 
@@ -35,6 +50,14 @@ def max_consecutive_run(jogo: List[int]) -> int:
             cur = 1
     return best
 
+def max_consecutive_run_mask(mask: int) -> int:
+    # SWAR: cada `mask &= mask >> 1` encurta todas as sequências em 1 bit
+    n = 0
+    while mask:
+        mask &= mask >> 1
+        n += 1
+    return n
+
 def build_faixas(step: int = 5) -> List[tuple[int, int]]:
     faixas: List[tuple[int, int]] = []
     start = 1
@@ -37,6 +37,9 @@ class StatEliteMemoryBrain(BaseBrain):
     - Aprende “para sempre” (24/7) a cada novo jogo salvo em memoria_jogos.
     """
 
+    # generate lê memoria_jogos (_sync_from_db): precisa do banco, roda no processo principal
+    parallel_generate = False
+
     def __init__(
         self,
         db_conn,
@@ -103,7 +106,7 @@ class StatEliteMemoryBrain(BaseBrain):
         if not elite_rank:
             elite_rank = strong_rank[:]
         if not strong_rank:
-            strong_rank = UNIVERSO[:]
+            strong_rank = list(UNIVERSO)
 
         # alvo paridade (leve)
         target_even = self._target_even(context=context, size=size)
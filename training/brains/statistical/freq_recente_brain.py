@@ -58,7 +58,7 @@ class StatFreqRecenteBrain(BaseBrain):
 
         # ranqueia por frequência recente
         ranked = sorted(UNIVERSO, key=lambda d: self.freq.get(d, 0), reverse=True)
-        core = ranked[:core_size] if ranked else UNIVERSO[:]
+        core = ranked[:core_size]
 
         jogos: List[List[int]] = []
         for _ in range(n):
@@ -1,13 +1,22 @@
 # training/brains/statistical/nucleo_satelites_brain.py
 from __future__ import annotations
 
+import heapq
 import random
 from collections import Counter
 from typing import Any, Dict, List, Tuple, Optional
 
+import numpy as np
+
 from config.game import DIA_DE_SORTE_RULES
 from training.core.base_brain import BaseBrain
-from training.brains._utils import UNIVERSO, weighted_sample_without_replacement, count_even, max_consecutive_run
+from training.brains._utils import (
+    UNIVERSO,
+    UNIVERSO_MAX,
+    weighted_sample_without_replacement,
+    count_even,
+    max_consecutive_run,
+)
 
 
 def _pair_key(a: int, b: int) -> Tuple[int, int]:
@@ -30,7 +39,8 @@ class StatNucleoSatelitesBrain(BaseBrain):
 
     Performance:
     - Mantém Counter de freq e Counter de pares
-    - Poda pares para não crescer infinito (top_k)
+    - Espelha os pares numa matriz densa simétrica (_pair_mat) para score vetorizado
+    - Poda pares para não crescer infinito (top_k, amortizada com folga de 25%)
     - Estado salvo no SQLite via BaseBrain (cerebro_estado JSON)
 
     Observação:
@@ -63,6 +73,9 @@ class StatNucleoSatelitesBrain(BaseBrain):
         # caches derivados
         self._cached_nucleo: List[int] = []
         self._cached_satelites: List[int] = []
+        self._pair_mat = np.zeros((UNIVERSO_MAX + 1, UNIVERSO_MAX + 1), dtype=np.int64)
+        self._nucleo_mask = np.zeros(UNIVERSO_MAX + 1, dtype=bool)
+        self._sat_mask = np.zeros(UNIVERSO_MAX + 1, dtype=bool)
 
         self.load_state()
         self._rebuild_from_state()
@@ -93,9 +106,9 @@ class StatNucleoSatelitesBrain(BaseBrain):
 
         # fallback se ainda estiver fraco
         if not nucleo:
-            nucleo = UNIVERSO[:]
+            nucleo = list(UNIVERSO)
         if not sat:
-            sat = UNIVERSO[:]
+            sat = list(UNIVERSO)
 
         # alvo de paridade pelo contexto
         target_even = self._target_even(context=context, size=size)
@@ -104,13 +117,21 @@ class StatNucleoSatelitesBrain(BaseBrain):
         ranked_rec = sorted(UNIVERSO, key=lambda d: freq_rec.get(d, 0), reverse=True)
         top_rec = ranked_rec[:12] if ranked_rec else []
 
+        # invariantes do loop (dependem só de size/estado, não do jogo em construção)
+        k_nucleo = min(max(3, int(round(size * 0.3))), len(nucleo))
+        k_sat_max = int(round(size * 0.45))
+        k_elite_max = max(0, int(round(size * 0.20)))
+        elite_pool_cap = max(10, int(round(size * 1.2)))
+        polish_scores = self._polish_scores(context)
+        elite_rank: List[int] = []
+        if self.elite_freq:
+            elite_rank = sorted(UNIVERSO, key=lambda d: self.elite_freq.get(d, 0), reverse=True)[:elite_pool_cap]
+
         jogos: List[List[int]] = []
         for _ in range(n):
             jogo = set()
 
             # 1) núcleo (fixo pequeno)
-            k_nucleo = max(3, int(round(size * 0.3)))
-            k_nucleo = min(k_nucleo, len(nucleo))
             if k_nucleo > 0:
                 jogo.update(random.sample(nucleo, k_nucleo))
 
@@ -133,7 +154,7 @@ class StatNucleoSatelitesBrain(BaseBrain):
                     w += 0.25 * float(freq_rec.get(int(d), 0))
                     weights[int(d)] = w
 
-                k_sat = max(0, min(len(sat_pool), int(round(size * 0.45))))
+                k_sat = max(0, min(len(sat_pool), k_sat_max))
                 k_sat = min(k_sat, remaining)
                 if k_sat > 0:
                     picks = weighted_sample_without_replacement(weights, k_sat)
@@ -141,11 +162,10 @@ class StatNucleoSatelitesBrain(BaseBrain):
 
             # 3) reforço por dezenas "elite"
             remaining = size - len(jogo)
-            if remaining > 0 and self.elite_freq:
-                elite_rank = sorted(UNIVERSO, key=lambda d: self.elite_freq.get(d, 0), reverse=True)
-                elite_pool = [d for d in elite_rank[: max(10, int(round(size * 1.2)))] if d not in jogo]
+            if remaining > 0 and elite_rank:
+                elite_pool = [d for d in elite_rank if d not in jogo]
                 if elite_pool:
-                    take = min(remaining, max(0, int(round(size * 0.20))))
+                    take = min(remaining, k_elite_max)
                     take = min(take, len(elite_pool))
                     if take > 0:
                         jogo.update(random.sample(elite_pool, take))
@@ -160,7 +180,9 @@ class StatNucleoSatelitesBrain(BaseBrain):
                     jogo.add(random.choice(UNIVERSO))
 
             # 5) ajuste leve para paridade/run (sem explosão de custo)
-            jogo = self._polish_game(list(jogo), size=size, target_even=target_even, context=context)
+            jogo = self._polish_game(
+                list(jogo), size=size, target_even=target_even, context=context, polish_scores=polish_scores
+            )
             jogos.append(sorted(jogo))
 
         return jogos
@@ -169,21 +191,17 @@ class StatNucleoSatelitesBrain(BaseBrain):
         if not jogo:
             return 0.0
 
-        nucleo = set(self._cached_nucleo or [])
-        sat = set(self._cached_satelites or [])
+        jogo_idx = np.asarray(jogo, dtype=np.intp)
 
         # 1) presença em núcleo e satélites
-        in_nuc = sum(1 for d in jogo if int(d) in nucleo)
-        in_sat = sum(1 for d in jogo if int(d) in sat)
+        in_nuc = int(self._nucleo_mask[jogo_idx].sum())
+        in_sat = int(self._sat_mask[jogo_idx].sum())
 
-        s_core = (in_nuc / max(1.0, float(len(nucleo) or 1))) * 0.60 + (in_sat / float(len(jogo))) * 0.40
+        s_core = (in_nuc / max(1.0, float(len(self._cached_nucleo) or 1))) * 0.60 + (in_sat / float(len(jogo))) * 0.40
         s_core = max(0.0, min(1.0, s_core))
 
-        # 2) pares fortes internos (normalizado)
-        ps = 0.0
-        for i in range(len(jogo)):
-            for j in range(i + 1, len(jogo)):
-                ps += float(self.pairs.get(_pair_key(int(jogo[i]), int(jogo[j])), 0))
+        # 2) pares fortes internos (normalizado): sub-matriz simétrica conta cada par 2x
+        ps = float(self._pair_mat[np.ix_(jogo_idx, jogo_idx)].sum()) / 2.0
         ps = ps / 300.0  # escala comparativa
 
         # 3) elite boost
@@ -228,6 +246,10 @@ class StatNucleoSatelitesBrain(BaseBrain):
             for j in range(i + 1, len(res_set)):
                 self.pairs[_pair_key(res_set[i], res_set[j])] += 1
 
+        res_idx = np.asarray(res_set, dtype=np.intp)
+        self._pair_mat[np.ix_(res_idx, res_idx)] += 1
+        self._pair_mat[res_idx, res_idx] -= 1  # diagonal não é par
+
         # 3) sinal elite (quando quase acertou)
         if int(pontos) >= 6 and jogo:
             for d in set(int(x) for x in jogo):
@@ -235,8 +257,8 @@ class StatNucleoSatelitesBrain(BaseBrain):
 
         self.learn_steps += 1
 
-        # 4) poda periódica (não crescer infinito)
-        if self.learn_steps % 60 == 0:
+        # 4) poda amortizada (não crescer infinito): só quando passa da folga
+        if len(self.pairs) > int(self.top_pairs_keep * 1.25):
             self._prune_pairs()
 
         # 5) atualiza núcleo/satélites periodicamente
@@ -298,17 +320,34 @@ class StatNucleoSatelitesBrain(BaseBrain):
             self.pairs = Counter()
             self.elite_freq = Counter()
             self.learn_steps = 0
+        self._rebuild_pair_mat()
+
+    def _rebuild_pair_mat(self) -> None:
+        self._pair_mat.fill(0)
+        for (a, b), c in self.pairs.items():
+            self._pair_mat[a, b] = c
+            self._pair_mat[b, a] = c
 
     def _prune_pairs(self) -> None:
-        if len(self.pairs) <= self.top_pairs_keep:
+        """
+        Remove só a cauda (os pares mais fracos) em vez de recriar o Counter inteiro.
+        """
+        excesso = len(self.pairs) - self.top_pairs_keep
+        if excesso <= 0:
             return
-        self.pairs = Counter(dict(self.pairs.most_common(self.top_pairs_keep)))
+        for key, _ in heapq.nsmallest(excesso, self.pairs.items(), key=lambda kv: kv[1]):
+            del self.pairs[key]
+            a, b = key
+            self._pair_mat[a, b] = 0
+            self._pair_mat[b, a] = 0
 
     def _recompute_core(self) -> None:
         """
         Núcleo = dezenas mais "centrais" (freq + força de pares).
         Satélites = dezenas que mais se conectam ao núcleo.
         """
+        self._nucleo_mask.fill(False)
+        self._sat_mask.fill(False)
         if not self.freq:
             self._cached_nucleo = []
             self._cached_satelites = []
@@ -342,6 +381,9 @@ class StatNucleoSatelitesBrain(BaseBrain):
         sat_rank = sorted([d for d in UNIVERSO if d not in nucleo_set], key=sat_score, reverse=True)
         self._cached_satelites = sat_rank[:18]
 
+        self._nucleo_mask[self._cached_nucleo] = True
+        self._sat_mask[self._cached_satelites] = True
+
     def _target_even(self, context: Dict[str, Any], size: int) -> int:
         """
         Alvo de paridade baseado no último resultado, mas com clamp.
@@ -356,7 +398,33 @@ class StatNucleoSatelitesBrain(BaseBrain):
             t = base
         return int(max(2, min(size - 2, t)))
 
-    def _polish_game(self, jogo: List[int], size: int, target_even: int, context: Dict[str, Any]) -> List[int]:
+    def _polish_scores(self, context: Dict[str, Any]) -> Tuple[List[float], List[float]]:
+        """
+        Parte fixa dos scores de troca do _polish_game (por dezena, índice = dezena).
+        Só depende do contexto e do estado, então é avaliada uma vez por generate.
+        """
+        freq_rec = context.get("freq_recente") or {}
+        nucleo_top = self._cached_nucleo[:6] if self._cached_nucleo else []
+        conect = self._pair_mat[nucleo_top].sum(axis=0) if nucleo_top else np.zeros(UNIVERSO_MAX + 1)
+
+        bad = [0.0] * (UNIVERSO_MAX + 1)
+        good = [0.0] * (UNIVERSO_MAX + 1)
+        for d in UNIVERSO:
+            fr = float(freq_rec.get(d, 0))
+            el = float(self.elite_freq.get(d, 0))
+            bad[d] = 0.6 * fr + 0.4 * el
+            # conectividade com núcleo
+            good[d] = 0.55 * fr + 0.35 * el + 0.10 * float(conect[d])
+        return bad, good
+
+    def _polish_game(
+        self,
+        jogo: List[int],
+        size: int,
+        target_even: int,
+        context: Dict[str, Any],
+        polish_scores: Optional[Tuple[List[float], List[float]]] = None,
+    ) -> List[int]:
         """
         Ajuste leve (barato):
         - aproxima paridade
@@ -372,8 +440,9 @@ class StatNucleoSatelitesBrain(BaseBrain):
                 jogo.append(cand)
         jogo = sorted(set(jogo))[:size]
 
+        bad, good = polish_scores or self._polish_scores(context)
+
         # tenta 10 micro-ajustes no máximo (barato)
-        freq_rec = context.get("freq_recente") or {}
         for _ in range(10):
             ev = count_even(jogo)
             run = max_consecutive_run(jogo)
@@ -383,12 +452,8 @@ class StatNucleoSatelitesBrain(BaseBrain):
             if ok_even and ok_run:
                 break
 
-            # escolhe uma dezena para trocar (pior por recência + elite)
-            def bad_score(d: int) -> float:
-                return 0.6 * float(freq_rec.get(d, 0)) + 0.4 * float(self.elite_freq.get(d, 0))
-
-            # remove um dos piores
-            worst = sorted(jogo, key=bad_score)[:3]
+            # remove um dos piores (por recência + elite)
+            worst = sorted(jogo, key=bad.__getitem__)[:3]
             out = random.choice(worst) if worst else random.choice(jogo)
 
             # escolhe candidato melhor
@@ -396,16 +461,7 @@ class StatNucleoSatelitesBrain(BaseBrain):
             if not pool:
                 break
 
-            def good_score(d: int) -> float:
-                s = 0.55 * float(freq_rec.get(d, 0))
-                s += 0.35 * float(self.elite_freq.get(d, 0))
-                # conectividade com núcleo
-                for nn in (self._cached_nucleo[:6] if self._cached_nucleo else []):
-                    s += 0.10 * float(self.pairs.get(_pair_key(d, nn), 0))
-                s += 0.08 * random.random()
-                return s
-
-            pool_sorted = sorted(pool, key=good_score, reverse=True)
+            pool_sorted = sorted(pool, key=lambda d: good[d] + 0.08 * random.random(), reverse=True)
             newd = random.choice(pool_sorted[: min(10, len(pool_sorted))])
 
             jogo2 = [x for x in jogo if x != out] + [newd]
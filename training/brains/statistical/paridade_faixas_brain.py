@@ -3,14 +3,18 @@ from __future__ import annotations
 
 import random
 from collections import Counter
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List
 
 from training.core.base_brain import BaseBrain
-from training.brains._utils import UNIVERSO, build_faixas, count_even
+from training.brains._utils import UNIVERSO, UNIVERSO_MAX, build_faixas, count_even
 
 
 FAIXAS = build_faixas()
 
+# distribuição por faixas empacotada num int: 4 bits por faixa (contagem <= 15)
+_FAIXA_BITS = 4
+_FAIXA_MASK = (1 << _FAIXA_BITS) - 1
+
 
 def faixa_of(d: int) -> int:
     for i, (a, b) in enumerate(FAIXAS):
@@ -19,6 +23,29 @@ def faixa_of(d: int) -> int:
     return -1
 
 
+# incremento pré-calculado por dezena: somar 1 << (4 * faixa) conta a dezena na faixa certa
+_FAIXA_INC = [0] + [1 << (_FAIXA_BITS * faixa_of(d)) for d in range(1, UNIVERSO_MAX + 1)]
+
+
+def _pack_faixas(fa: List[int]) -> int:
+    key = 0
+    for i, qtd in enumerate(fa):
+        key |= int(qtd) << (_FAIXA_BITS * i)
+    return key
+
+
+def _unpack_faixas(key: int) -> List[int]:
+    return [(key >> (_FAIXA_BITS * i)) & _FAIXA_MASK for i in range(len(FAIXAS))]
+
+
+def _faixas_key(jogo: List[int]) -> int:
+    """chave empacotada da distribuição por faixas do jogo (sem tupla intermediária)"""
+    key = 0
+    for d in jogo:
+        key += _FAIXA_INC[int(d)]
+    return key
+
+
 class StatParidadeFaixasBrain(BaseBrain):
     """
     Cérebro Estatístico: Paridade + Faixas Numéricas
@@ -45,7 +72,7 @@ class StatParidadeFaixasBrain(BaseBrain):
         )
 
         self.dist_even: Counter[int] = Counter()
-        self.dist_faixas: Counter[Tuple[int, ...]] = Counter()
+        self.dist_faixas: Counter[int] = Counter()  # chave = _pack_faixas(distribuição)
         self.learn_steps = 0
 
         self.load_state()
@@ -84,7 +111,8 @@ class StatParidadeFaixasBrain(BaseBrain):
             while len(jogo) < size:
                 jogo.add(random.choice(UNIVERSO))
 
-            jogo = sorted(jogo)
+            # paridade não depende de ordem: ordena uma vez só, no fim
+            jogo = list(jogo)
 
             # micro-ajuste de paridade
             for _ in range(8):
@@ -107,21 +135,17 @@ class StatParidadeFaixasBrain(BaseBrain):
                 pool = [d for d in UNIVERSO if d not in jogo]
                 if pool:
                     jogo.append(random.choice(pool))
-                jogo = sorted(set(jogo))
 
-            jogos.append(sorted(jogo[:size]))
+            jogos.append(sorted(jogo)[:size])
 
         return jogos
 
     def score_game(self, jogo: List[int], context: Dict[str, Any]) -> float:
         ev = count_even(jogo)
-        fa = [0] * len(FAIXAS)
-        for d in jogo:
-            fa[faixa_of(d)] += 1
 
         # score baseado na proximidade das distribuições aprendidas
         s_even = self.dist_even.get(ev, 0)
-        s_faixa = self.dist_faixas.get(tuple(fa), 0)
+        s_faixa = self.dist_faixas.get(_faixas_key(jogo), 0)
 
         return float(0.6 * s_even + 0.4 * s_faixa)
 
@@ -141,12 +165,9 @@ class StatParidadeFaixasBrain(BaseBrain):
         peso = 3 if pontos >= 6 else 1
 
         ev = count_even(jogo)
-        fa = [0] * len(FAIXAS)
-        for d in jogo:
-            fa[faixa_of(d)] += 1
 
         self.dist_even[ev] += peso
-        self.dist_faixas[tuple(fa)] += peso
+        self.dist_faixas[_faixas_key(jogo)] += peso
 
         self._perf_update(concurso=int(concurso_n), pontos=int(pontos), jogos_gerados=1)
 
@@ -157,7 +178,8 @@ class StatParidadeFaixasBrain(BaseBrain):
         self.state = {
             "learn_steps": self.learn_steps,
             "dist_even": dict(self.dist_even),
-            "dist_faixas": {",".join(map(str, k)): v for k, v in self.dist_faixas.items()},
+            # mantém o formato "a,b,c,..." no JSON (compatível com estados antigos)
+            "dist_faixas": {",".join(map(str, _unpack_faixas(k))): v for k, v in self.dist_faixas.items()},
         }
         super().save_state()
 
@@ -167,7 +189,7 @@ class StatParidadeFaixasBrain(BaseBrain):
             self.learn_steps = int(self.state.get("learn_steps", 0))
             self.dist_even = Counter({int(k): int(v) for k, v in self.state.get("dist_even", {}).items()})
             self.dist_faixas = Counter({
-                tuple(map(int, k.split(","))): int(v)
+                _pack_faixas([int(x) for x in k.split(",")]): int(v)
                 for k, v in self.state.get("dist_faixas", {}).items()
             })
         except Exception:
@@ -194,5 +216,5 @@ class StatParidadeFaixasBrain(BaseBrain):
         for k, v in self.dist_faixas.items():
             acc += v
             if acc >= r:
-                return list(k)
-        return list(random.choice(list(self.dist_faixas.keys())))
+                return _unpack_faixas(k)
+        return _unpack_faixas(random.choice(list(self.dist_faixas.keys())))
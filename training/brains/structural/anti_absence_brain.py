@@ -1,10 +1,13 @@
 from __future__ import annotations
 
-from collections import Counter, defaultdict
+import heapq
+from collections import defaultdict
 from typing import Any, Dict, List, Tuple
 
+import numpy as np
+
 from config.game import DIA_DE_SORTE_RULES
-from training.brains._utils import UNIVERSO, weighted_sample_without_replacement
+from training.brains._utils import UNIVERSO, UNIVERSO_ARR, dezenas_mask, np_rng
 from training.core.base_brain import BaseBrain
 
 
@@ -34,6 +37,11 @@ class StructuralAntiAbsenceBrain(BaseBrain):
         self.janela_recente = int(janela_recente)
         self.state = self.state or {"core_c": []}
 
+        self._core_a_mask = dezenas_mask(self.core_a)
+        self._core_b_mask = dezenas_mask(self.core_b)
+        # cache do núcleo C por contexto: (chave, lista, máscara)
+        self._core_c_cache: Tuple[Tuple[int, Tuple[int, ...], int], List[int], int] | None = None
+
     def evaluate_context(self, context: Dict[str, Any]) -> float:
         historico = context.get("historico_recente") or []
         return 0.9 if len(historico) >= 60 else 0.7
@@ -43,7 +51,8 @@ class StructuralAntiAbsenceBrain(BaseBrain):
         n = int(n)
         core_c = self._build_core_c(context)
         freq = context.get("freq_recente") or {}
-        weights = {d: float(freq.get(d, 0)) + 1.0 for d in UNIVERSO}
+        w_arr = np.fromiter((float(freq.get(d, 0)) + 1.0 for d in UNIVERSO), dtype=np.float64, count=len(UNIVERSO))
+        rng = np_rng()
 
         jogos: List[List[int]] = []
         for _ in range(n):
@@ -52,10 +61,18 @@ class StructuralAntiAbsenceBrain(BaseBrain):
             jogo.update(self.core_b[: min(8, max(0, size - len(jogo)))])
             faltam = size - len(jogo)
             if faltam > 0:
-                pool = {d: w for d, w in weights.items() if d not in jogo}
-                if not pool:
-                    pool = {d: 1.0 for d in UNIVERSO if d not in jogo}
-                jogo.update(weighted_sample_without_replacement(pool, faltam))
+                # dezena d -> índice d-1 no array do universo
+                mask = np.ones(len(UNIVERSO), dtype=bool)
+                mask[np.fromiter(jogo, dtype=np.int64, count=len(jogo)) - 1] = False
+                pool = UNIVERSO_ARR[mask]
+                faltam = min(faltam, len(pool))
+                # amostragem ponderada sem reposição (Efraimidis-Spirakis): top-k de log(u)/w
+                keys = np.log(rng.random(len(pool))) / w_arr[mask]
+                if faltam < len(pool):
+                    picks = pool[np.argpartition(-keys, faltam - 1)[:faltam]]
+                else:
+                    picks = pool
+                jogo.update(int(d) for d in picks)
             jogos.append(sorted(jogo))
         return jogos
 
@@ -73,15 +90,16 @@ class StructuralAntiAbsenceBrain(BaseBrain):
         pontos: int,
         context: Dict[str, Any],
     ) -> None:
-        core_c = self._build_core_c(context)
+        core_c, _ = self._core_c_with_mask(context)
         self.state["core_c"] = core_c
         self._perf_update(concurso=int(concurso_n), pontos=int(pontos), jogos_gerados=1)
 
     def _risk_absence(self, jogo: List[int], context: Dict[str, Any]) -> float:
-        core_c = self._build_core_c(context)
-        hit_a = len(set(jogo) & set(self.core_a))
-        hit_b = len(set(jogo) & set(self.core_b))
-        hit_c = len(set(jogo) & set(core_c))
+        core_c, core_c_mask = self._core_c_with_mask(context)
+        jogo_mask = dezenas_mask(jogo)
+        hit_a = (jogo_mask & self._core_a_mask).bit_count()
+        hit_b = (jogo_mask & self._core_b_mask).bit_count()
+        hit_c = (jogo_mask & core_c_mask).bit_count()
 
         penalty = 0.0
         if hit_a < max(2, len(self.core_a) - 1):
@@ -92,21 +110,39 @@ class StructuralAntiAbsenceBrain(BaseBrain):
             penalty += 0.15
         return min(0.9, penalty)
 
+    def _core_c_with_mask(self, context: Dict[str, Any]) -> Tuple[List[int], int]:
+        """
+        Núcleo C + máscara, recalculado só quando o contexto (histórico) muda.
+        """
+        historico = context.get("historico_recente") or []
+        # chave pelo conteúdo (não id(): lista liberada pode ter o id reaproveitado)
+        ultimo = tuple(int(x) for x in historico[-1]) if len(historico) else ()
+        key = (len(historico), ultimo, int(context.get("concurso_n", 0) or 0))
+        cached = self._core_c_cache
+        if cached is not None and cached[0] == key:
+            return cached[1], cached[2]
+        core_c = self._build_core_c(context)
+        core_c_mask = dezenas_mask(core_c)
+        self._core_c_cache = (key, core_c, core_c_mask)
+        return core_c, core_c_mask
+
     def _build_core_c(self, context: Dict[str, Any]) -> List[int]:
         historico = context.get("historico_recente") or []
         recent = historico[-self.janela_recente :] if historico else []
-        coocc = Counter()
+        # sorteio ordenado uma vez: o par (j[i], j[k]) com i < k já sai ordenado
+        coocc: Dict[Tuple[int, int], int] = defaultdict(int)
         for jogo in recent:
-            for i in range(len(jogo)):
-                for j in range(i + 1, len(jogo)):
-                    key = tuple(sorted((jogo[i], jogo[j])))
-                    coocc[key] += 1
+            j = sorted(jogo)
+            n = len(j)
+            for i in range(n):
+                a = j[i]
+                for k in range(i + 1, n):
+                    coocc[(a, j[k])] += 1
         score_map = defaultdict(int)
         for (a, b), score in coocc.items():
             score_map[a] += score
             score_map[b] += score
-        ranked = sorted(score_map.items(), key=lambda x: x[1], reverse=True)
-        core_c = [d for d, _ in ranked[:5]]
+        core_c = [d for d, _ in heapq.nlargest(5, score_map.items(), key=lambda x: x[1])]
         return core_c
 
     def _default_core(self, count: int) -> List[int]:
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
-from collections import Counter, defaultdict
-from typing import Any, Dict, List, Tuple
+import heapq
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
 
 from config.game import DIA_DE_SORTE_RULES
-from training.brains._utils import UNIVERSO, weighted_sample_without_replacement
+from training.brains._utils import UNIVERSO, UNIVERSO_MAX, dezenas_mask, weighted_sample_without_replacement
 from training.core.base_brain import BaseBrain
 
 
@@ -14,6 +17,9 @@ class StructuralCoreProtectBrain(BaseBrain):
     - Aprende coocorrências fortes no histórico recente.
     - Gera jogos garantindo presença mínima do núcleo.
     - Penaliza ausência de blocos críticos que derrubam pontuação.
+
+    Blocos são guardados como máscara de bits (bit d = dezena d presente);
+    no estado JSON viram lista [[mascara, penalidade], ...].
     """
 
     def __init__(
@@ -38,8 +44,11 @@ class StructuralCoreProtectBrain(BaseBrain):
 
         self.state = self.state or {
             "core_seed": self._default_core_seed(),
-            "block_penalties": {},
+            "block_penalties": [],
         }
+        self._block_penalties: Dict[int, float] = {}
+        self._penalties_dirty = False
+        self._rebuild_from_state()
 
     def evaluate_context(self, context: Dict[str, Any]) -> float:
         historico = context.get("historico_recente") or []
@@ -73,12 +82,13 @@ class StructuralCoreProtectBrain(BaseBrain):
             return 0.0
         core = self._build_core(context)
         required = min(self.required_in_core, len(core), len(jogo))
-        core_hits = len(set(jogo) & set(core))
+        jogo_mask = dezenas_mask(jogo)
+        core_hits = (dezenas_mask(core) & jogo_mask).bit_count()
         if core_hits < required:
             return 0.05
 
         base = core_hits / max(1, len(core))
-        penalty = self._penalty_for_missing_blocks(jogo)
+        penalty = self._penalty_for_missing_blocks(jogo_mask)
         return max(0.0, min(1.0, base - penalty))
 
     def learn(
@@ -92,43 +102,83 @@ class StructuralCoreProtectBrain(BaseBrain):
         if not resultado_n1 or not jogo:
             return
         core = self._build_core(context)
-        missing_core = len(set(core) - set(jogo))
+        core_mask = dezenas_mask(core)
+        missing_core = (core_mask & ~dezenas_mask(jogo)).bit_count()
 
-        block_penalties = self.state.get("block_penalties", {})
+        block_penalties = self._block_penalties
         if missing_core >= 2 and pontos <= 4:
-            blocks = self._extract_blocks(core, sizes=(2, 3))
-            for block in blocks:
-                key = ",".join(map(str, block))
+            for key in self._extract_block_masks(core, sizes=(2, 3)):
                 block_penalties[key] = block_penalties.get(key, 0.0) + 0.1
+            self._penalties_dirty = True
 
-        self.state["block_penalties"] = block_penalties
         self._perf_update(concurso=int(concurso_n), pontos=int(pontos), jogos_gerados=1)
 
+    def save_state(self) -> None:
+        # o estado em memória só é reescrito quando o learn mexeu nas penalidades
+        if self._penalties_dirty:
+            self.state["block_penalties"] = [[int(m), float(v)] for m, v in self._block_penalties.items()]
+            self._penalties_dirty = False
+        super().save_state()
+
+    def load_state(self) -> None:
+        super().load_state()
+        self._rebuild_from_state()
+
+    def _rebuild_from_state(self) -> None:
+        if not self.state.get("core_seed"):
+            self.state["core_seed"] = self._default_core_seed()
+        raw = self.state.get("block_penalties") or []
+        penalties: Dict[int, float] = {}
+        legacy = isinstance(raw, dict)
+        try:
+            if legacy:
+                # formato legado: {"3,7,12": 0.2}
+                for key, value in raw.items():
+                    block = [int(x) for x in str(key).split(",") if x]
+                    if block:
+                        mask = dezenas_mask(block)
+                        penalties[mask] = penalties.get(mask, 0.0) + float(value)
+            else:
+                for mask, value in raw:
+                    penalties[int(mask)] = float(value)
+        except Exception:
+            penalties = {}
+            legacy = True
+        self._block_penalties = penalties
+        # formato legado/inválido: converte uma vez e deixa a regravação para o próximo save_state
+        self._penalties_dirty = legacy
+        if legacy:
+            self.state["block_penalties"] = []
+
     def _build_core(self, context: Dict[str, Any]) -> List[int]:
         historico = context.get("historico_recente") or []
         recent = historico[-self.janela_recente :] if historico else []
-        coocc = Counter()
-        freq = Counter()
-        for jogo in recent:
-            freq.update(jogo)
-            for i in range(len(jogo)):
-                for j in range(i + 1, len(jogo)):
-                    key = tuple(sorted((jogo[i], jogo[j])))
-                    coocc[key] += 1
-
-        if not freq:
+        if not recent:
             return list(self.state.get("core_seed", []))[: self.core_size]
 
-        ranked = sorted(coocc.items(), key=lambda x: x[1], reverse=True)[: self.max_blocks]
+        # sorteios (R, k) na ordem original das linhas: a ordem de 1º encontro desempata os empates
+        arr = np.asarray(recent, dtype=np.int64)
+        dim = UNIVERSO_MAX + 1
+
+        # coocorrência: pares (i<j) codificados como min*dim + max, na ordem do laço i/j por linha
+        i_idx, j_idx = np.triu_indices(arr.shape[1], k=1)
+        ai, bj = arr[:, i_idx], arr[:, j_idx]
+        flat = (np.minimum(ai, bj) * dim + np.maximum(ai, bj)).ravel()
+        pares, primeiro, contagem = np.unique(flat, return_index=True, return_counts=True)
+
+        # maior contagem primeiro; empate pelo 1º encontro (mesma ordem do sorted estável sobre Counter)
+        ordem = np.lexsort((primeiro, -contagem))[: self.max_blocks]
         score_map = defaultdict(int)
-        for (a, b), score in ranked:
+        for key, score in zip(pares[ordem].tolist(), contagem[ordem].tolist()):
+            a, b = divmod(key, dim)
             score_map[a] += score
             score_map[b] += score
 
-        core_sorted = sorted(score_map.items(), key=lambda x: x[1], reverse=True)
-        core = [d for d, _ in core_sorted][: self.core_size]
+        core = [d for d, _ in heapq.nlargest(self.core_size, score_map.items(), key=lambda x: x[1])]
         if len(core) < self.core_size:
-            extras = [d for d, _ in freq.most_common() if d not in core]
+            # Counter.most_common: frequência desc, empate pelo 1º encontro
+            dezenas, primeiro_d, freq = np.unique(arr.ravel(), return_index=True, return_counts=True)
+            extras = [d for d in dezenas[np.lexsort((primeiro_d, -freq))].tolist() if d not in core]
             core.extend(extras[: self.core_size - len(core)])
         return core
 
@@ -144,24 +194,23 @@ class StructuralCoreProtectBrain(BaseBrain):
             for i in range(1, self.core_size + 1)
         ]
 
-    def _extract_blocks(self, core: List[int], sizes: Tuple[int, ...]) -> List[Tuple[int, ...]]:
-        blocks: List[Tuple[int, ...]] = []
+    def _extract_block_masks(self, core: List[int], sizes: Tuple[int, ...]) -> Iterator[int]:
+        # máscara já é independente de ordem: dispensa ordenar cada janela
         for size in sizes:
             if size <= 0 or size > len(core):
                 continue
             for i in range(len(core) - size + 1):
-                block = tuple(sorted(core[i : i + size]))
-                blocks.append(block)
-        return blocks
+                mask = 0
+                for d in core[i : i + size]:
+                    mask |= 1 << d
+                yield mask
 
-    def _penalty_for_missing_blocks(self, jogo: List[int]) -> float:
-        penalties = self.state.get("block_penalties", {})
+    def _penalty_for_missing_blocks(self, jogo_mask: int) -> float:
+        penalties = self._block_penalties
         if not penalties:
             return 0.0
-        jogo_set = set(jogo)
         total = 0.0
-        for key, value in penalties.items():
-            block = {int(x) for x in key.split(",") if x}
-            if block and not block.issubset(jogo_set):
-                total += float(value)
+        for mask, value in penalties.items():
+            if mask & jogo_mask != mask:
+                total += value
         return min(0.5, total)
@@ -1,57 +1,255 @@
 # training/brains/structural/pattern_shape_brain.py
 from __future__ import annotations
 
+from array import array
 from collections import Counter
-from typing import Any, Dict, List, Tuple
+from functools import lru_cache
+from typing import Any, Dict, List, Set, Tuple
+import base64
 import random
+import time
+
+import numpy as np
 
 from training.core.base_brain import BaseBrain
 from config.game import DIA_DE_SORTE_RULES
 from training.brains._utils import (
     UNIVERSO,
+    UNIVERSO_MAX,
     build_faixas,
-    count_even,
-    max_consecutive_run,
+    dezenas_mask,
+    max_consecutive_run_mask,
     weighted_sample_without_replacement,
 )
 
 FAIXAS = build_faixas()
 
+# faixa de cada dezena (índice = dezena): troca a busca em FAIXAS por um acesso direto
+_BAND_OF = [0] + [
+    next(idx for idx, (a, b) in enumerate(FAIXAS) if a <= d <= b) for d in range(1, UNIVERSO_MAX + 1)
+]
+
+
+# constantes do universo (montadas uma vez no import)
+# jogos em construção são máscaras de bits: bit d ligado = dezena d no jogo
+_POOLS = tuple(tuple(x for x in UNIVERSO if a <= x <= b) for (a, b) in FAIXAS)
+_FULL_MASK = dezenas_mask(UNIVERSO)
+_EVEN_MASK = dezenas_mask(x for x in UNIVERSO if x % 2 == 0)
+_ODD_MASK = _FULL_MASK & ~_EVEN_MASK
+
+
+_SUM_BUCKETS = ("sum_lt_85", "sum_85_95", "sum_95_105", "sum_105_115", "sum_ge_115")
+_SUM_LIMITS = (0.85, 0.95, 1.05, 1.15)
+_SUM_BUCKET_IDX = {name: idx for idx, name in enumerate(_SUM_BUCKETS)}
+
+# shape empacotado num int: 4 bits p/ pares, 4 p/ run, 4 por faixa, 3 p/ bucket de soma
+_PACK_BITS = 4
+_PACK_MASK = (1 << _PACK_BITS) - 1
+_PACK_BANDS_SHIFT = 2 * _PACK_BITS
+_PACK_BUCKET_SHIFT = _PACK_BANDS_SHIFT + _PACK_BITS * len(FAIXAS)
+
+_BAND_OF_ARR = np.asarray(_BAND_OF, dtype=np.int64)
+
 
 def _bucket_sum(total: int, size: int) -> str:
     # Buckets relativos à média esperada por tamanho
     media = ((DIA_DE_SORTE_RULES.universo_max + 1) / 2.0) * size
-    if total < media * 0.85:
-        return "sum_lt_85"
-    if total < media * 0.95:
-        return "sum_85_95"
-    if total < media * 1.05:
-        return "sum_95_105"
-    if total < media * 1.15:
-        return "sum_105_115"
-    return "sum_ge_115"
-
-
-def _band_counts(jogo: List[int]) -> Tuple[int, ...]:
-    counts = [0 for _ in FAIXAS]
-    for d in jogo:
-        for idx, (a, b) in enumerate(FAIXAS):
-            if a <= d <= b:
-                counts[idx] += 1
-                break
-    return tuple(counts)
-
-
-def _shape_key(jogo: List[int]) -> str:
-    jogo = sorted(int(x) for x in jogo)
-    ev = count_even(jogo)
-    run = max_consecutive_run(jogo)
-    bands = _band_counts(jogo)
-    s = sum(jogo)
+    for name, limit in zip(_SUM_BUCKETS, _SUM_LIMITS):
+        if total < media * limit:
+            return name
+    return _SUM_BUCKETS[-1]
+
+
+def _pack_shape_key(key: str) -> int:
+    """e{ev}_r{run}_b{b1-b2-...}_{sum_bucket} -> int (ValueError se o formato não bater)"""
+    parts = key.split("_")
+    bands = [int(x) for x in parts[2][1:].split("-")]
+    if len(bands) != len(FAIXAS) or not parts[0].startswith("e") or not parts[1].startswith("r"):
+        raise ValueError(key)
+    packed = int(parts[0][1:]) | (int(parts[1][1:]) << _PACK_BITS)
+    for i, qtd in enumerate(bands):
+        packed |= qtd << (_PACK_BANDS_SHIFT + _PACK_BITS * i)
+    return packed | (_SUM_BUCKET_IDX["_".join(parts[3:])] << _PACK_BUCKET_SHIFT)
+
+
+def _unpack_shape_key(packed: int) -> str:
+    bands = "-".join(str(packed >> (_PACK_BANDS_SHIFT + _PACK_BITS * i) & _PACK_MASK) for i in range(len(FAIXAS)))
+    bucket = _SUM_BUCKETS[packed >> _PACK_BUCKET_SHIFT]
+    return f"e{packed & _PACK_MASK}_r{packed >> _PACK_BITS & _PACK_MASK}_b{bands}_{bucket}"
+
+
+# peso de cada Counter na tabela do score_batch (shape -> soma ponderada das contagens)
+_LUT_PESO_4 = 1.0
+_LUT_PESO_5 = 1.5
+_LUT_PESO_6 = 2.5
+
+# autosave do learn: no mínimo N learns e T segundos desde o último save
+_AUTOSAVE_LEARNS = 250
+_AUTOSAVE_MIN_SEG = 30.0
+
+# formato do estado: 1 = dict[str,int] por Counter; 2 = arrays nativos (array Q/I, base64);
+# 3 = arrays little-endian de tamanho fixo (<u8 chaves, <u4 contagens), iguais em qualquer máquina
+_STATE_FMT_VERSION = 3
+_KEYS_DTYPE = np.dtype("<u8")
+_VALS_DTYPE = np.dtype("<u4")
+
+
+def _counter_to_state(counter: Counter, prefix: str, out: Dict[str, Any]) -> None:
+    """Counter de shapes -> {prefix_keys: <u8[], prefix_vals: <u4[]} em base64 (+ prefix_raw p/ chaves fora do formato)."""
+    keys: List[int] = []
+    vals: List[int] = []
+    raw: Dict[str, int] = {}
+    for key, count in counter.items():
+        try:
+            keys.append(_pack_shape_key(key))
+        except (ValueError, KeyError, IndexError):
+            raw[key] = int(count)
+            continue
+        vals.append(int(count))
+    out[f"{prefix}_keys"] = base64.b64encode(np.asarray(keys, dtype=_KEYS_DTYPE).tobytes()).decode("ascii")
+    out[f"{prefix}_vals"] = base64.b64encode(np.asarray(vals, dtype=_VALS_DTYPE).tobytes()).decode("ascii")
+    if raw:
+        out[f"{prefix}_raw"] = raw
+
+
+def _counter_from_state(state: Dict[str, Any], prefix: str) -> Counter:
+    fmt = int(state.get("fmt_version", 1))
+    if fmt < 2:
+        return Counter(state.get(prefix, {}) or {})
+    keys_b = base64.b64decode(state.get(f"{prefix}_keys", ""))
+    vals_b = base64.b64decode(state.get(f"{prefix}_vals", ""))
+    if fmt == 2:
+        # formato 2 saiu em byte order/tamanho nativos da máquina que gravou (só lê; grava no 3)
+        keys = array("Q")
+        vals = array("I")
+        keys.frombytes(keys_b)
+        vals.frombytes(vals_b)
+        pares = zip(map(_unpack_shape_key, keys), vals)
+    else:
+        pares = zip(
+            map(_unpack_shape_key, np.frombuffer(keys_b, dtype=_KEYS_DTYPE).tolist()),
+            np.frombuffer(vals_b, dtype=_VALS_DTYPE).tolist(),
+        )
+    counter = Counter(dict(pares))
+    counter.update(state.get(f"{prefix}_raw", {}) or {})
+    return counter
+
+
+@lru_cache(maxsize=4096)
+def _shape_features(jogo: Tuple[int, ...]) -> Tuple[int, int, Tuple[int, ...], int]:
+    """
+    (pares, maior sequência, contagem por faixa, soma) numa única passada.
+    Espera o jogo já ordenado (tuple) — é a chave do cache.
+    """
+    evens = 0
+    total = 0
+    best_run = cur_run = 1
+    prev = None
+    bands = [0] * len(FAIXAS)
+    for x in jogo:
+        if x % 2 == 0:
+            evens += 1
+        total += x
+        if prev is not None:
+            if x == prev + 1:
+                cur_run += 1
+                if cur_run > best_run:
+                    best_run = cur_run
+            else:
+                cur_run = 1
+        prev = x
+        bands[_BAND_OF[x]] += 1
+    return evens, best_run, tuple(bands), total
+
+
+def _shape_key(jogo: Tuple[int, ...]) -> str:
+    ev, run, bands, s = _shape_features(jogo)
     band_tag = "-".join(str(x) for x in bands)
     return f"e{ev}_r{run}_b{band_tag}_{_bucket_sum(s, len(jogo))}"
 
 
+def _build_alias(weights: List[float]) -> Tuple[List[float], List[int]]:
+    """
+    Tabela de alias (Walker/Vose) em O(V): depois cada amostra é O(1).
+    i = randrange(V); fica com i se random() < prob[i], senão alias[i].
+    """
+    n = len(weights)
+    total = float(sum(weights))
+    scaled = [w * n / total for w in weights]
+    prob = [1.0] * n
+    alias = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s_i = small.pop()
+        l_i = large[-1]
+        prob[s_i] = scaled[s_i]
+        alias[s_i] = l_i
+        scaled[l_i] -= 1.0 - scaled[s_i]
+        if scaled[l_i] < 1.0:
+            small.append(large.pop())
+    # sobras (erro de arredondamento) ficam com prob 1.0
+    return prob, alias
+
+
+def _dezenas_of(mask: int) -> List[int]:
+    return [d for d in UNIVERSO if mask >> d & 1]
+
+
+def _repair_parity(mask: int, ev: int) -> int:
+    """troca ímpar<->par (até 20x) até o jogo ter `ev` pares"""
+    for _ in range(20):
+        cur_even = (mask & _EVEN_MASK).bit_count()
+        if cur_even == ev:
+            break
+        if cur_even < ev:
+            # trocar um ímpar por par
+            outs, ins = mask & _ODD_MASK, _EVEN_MASK & ~mask
+        else:
+            # trocar um par por ímpar
+            outs, ins = mask & _EVEN_MASK, _ODD_MASK & ~mask
+        if not outs or not ins:
+            break
+        out = random.choice(_dezenas_of(outs))
+        new = random.choice(_dezenas_of(ins))
+        mask = (mask & ~(1 << out)) | (1 << new)
+    return mask
+
+
+def _repair_runs(mask: int, run: int, size: int) -> int:
+    """quebra sequências maiores que `run` (até 25 swaps), mantendo o tamanho"""
+    for _ in range(25):
+        cur_run = max_consecutive_run_mask(mask)
+        if cur_run <= run:
+            break
+        # bits onde começa uma sequência de tamanho cur_run (a maior)
+        starts = mask
+        for k in range(1, cur_run):
+            starts &= mask >> k
+        # remove o número do meio de uma das maiores sequências
+        start = random.choice(_dezenas_of(starts))
+        mask &= ~(1 << (start + cur_run // 2))
+        # adiciona um número isolado (sem vizinhos no jogo): não cria sequência nova
+        livres = _FULL_MASK & ~mask
+        isolados = livres & ~(mask << 1) & ~(mask >> 1)
+        if isolados:
+            mask |= 1 << random.choice(_dezenas_of(isolados))
+        else:
+            pool = _dezenas_of(livres)
+            random.shuffle(pool)
+            for x in pool:
+                temp = mask | (1 << x)
+                if max_consecutive_run_mask(temp) <= run:
+                    mask = temp
+                    break
+        # garante tamanho
+        need = size - mask.bit_count()
+        if need > 0:
+            for x in random.sample(_dezenas_of(_FULL_MASK & ~mask), need):
+                mask |= 1 << x
+    return mask
+
+
 class StructuralPatternShapeBrain(BaseBrain):
     """
     Cérebro Estrutural: aprende "shape" (forma) de jogos bons.
@@ -75,6 +273,12 @@ class StructuralPatternShapeBrain(BaseBrain):
         self.shape_6 = Counter()
 
         self.total_learns = 0
+        self._learns_since_save = 0
+        self._last_save = time.monotonic()
+        self._score_lut: Dict[int, float] | None = None  # shape empacotado -> s4 + 1.5*s5 + 2.5*s6
+        # alias por Counter (shape_4/5/6): reconstruído só quando aquele Counter muda
+        self._alias_cache: Dict[int, Tuple[List[str], List[float], List[int]]] = {}
+        self._alias_dirty: Set[int] = set()
 
         self.load_state()
         self._rebuild_from_state()
@@ -112,12 +316,13 @@ class StructuralPatternShapeBrain(BaseBrain):
                 jogos.append(sorted(random.sample(UNIVERSO, size)))
             return jogos
 
-        # amostra shapes por peso
-        keys = list(source.keys())
-        weights = [max(1.0, float(source[k])) for k in keys]
+        # amostra shapes por peso via tabela de alias (O(1) por amostra)
+        keys, prob, alias = self._alias_for(source)
+        v = len(keys)
 
         for _ in range(n):
-            target = random.choices(keys, weights=weights, k=1)[0]
+            i = random.randrange(v)
+            target = keys[i] if random.random() < prob[i] else keys[alias[i]]
             jogo = self._generate_with_shape(target, size=size)
             jogos.append(sorted(jogo))
 
@@ -127,15 +332,52 @@ class StructuralPatternShapeBrain(BaseBrain):
         # score: quanto esse jogo “bate” com shapes premiados
         if not jogo:
             return 0.0
-        k = _shape_key(jogo)
+        k = _shape_key(tuple(sorted(int(x) for x in jogo)))
 
         s6 = float(self.shape_6.get(k, 0))
         s5 = float(self.shape_5.get(k, 0))
         s4 = float(self.shape_4.get(k, 0))
 
         # normalização simples (comparativo)
-        denom = 1.0 + s4 + 1.5 * s5 + 2.5 * s6
-        return (s4 + 1.5 * s5 + 2.5 * s6) / denom
+        weighted = _LUT_PESO_4 * s4 + _LUT_PESO_5 * s5 + _LUT_PESO_6 * s6
+        denom = 1.0 + weighted
+        return weighted / denom
+
+    def score_batch(self, jogos_2d: np.ndarray, context: Dict[str, Any]) -> np.ndarray:
+        """
+        score_game vetorizado para uma matriz (n, size) de jogos do mesmo tamanho:
+        calcula pares/run/faixas/soma de todas as linhas de uma vez e busca as
+        contagens pelo shape empacotado.
+        """
+        jogos = np.sort(np.asarray(jogos_2d, dtype=np.int64), axis=1)
+        n, size = jogos.shape
+        if n == 0 or size == 0:
+            return np.zeros(n, dtype=np.float64)
+
+        evens = (jogos % 2 == 0).sum(axis=1)
+
+        # maior sequência: contador por linha que zera quando a diferença != 1
+        consec = np.diff(jogos, axis=1) == 1
+        cur = np.zeros(n, dtype=np.int64)
+        best = np.zeros(n, dtype=np.int64)
+        for col in range(size - 1):
+            cur = (cur + 1) * consec[:, col]
+            np.maximum(best, cur, out=best)
+        runs = best + 1
+
+        band_idx = _BAND_OF_ARR[jogos]
+        media = ((DIA_DE_SORTE_RULES.universo_max + 1) / 2.0) * size
+        limits = np.asarray([media * limit for limit in _SUM_LIMITS])
+        buckets = np.searchsorted(limits, jogos.sum(axis=1), side="right")
+
+        packed = evens | (runs << _PACK_BITS) | (buckets << _PACK_BUCKET_SHIFT)
+        for i in range(len(FAIXAS)):
+            packed |= (band_idx == i).sum(axis=1) << (_PACK_BANDS_SHIFT + _PACK_BITS * i)
+
+        lut = self._score_lookup()
+        uniq, inv = np.unique(packed, return_inverse=True)
+        weighted = np.fromiter((lut.get(int(k), 0.0) for k in uniq), dtype=np.float64, count=len(uniq))[inv]
+        return weighted / (1.0 + weighted)
 
     def learn(
         self,
@@ -149,26 +391,46 @@ class StructuralPatternShapeBrain(BaseBrain):
         if not jogo:
             return
 
-        key = _shape_key(jogo)
+        key = _shape_key(tuple(sorted(int(x) for x in jogo)))
 
+        # peso somado na tabela do score_batch (1.0 por shape_4, 1.5 por shape_5, 2.5 por shape_6)
+        peso = 0.0
         if pontos >= 6:
             self.shape_6[key] += 1
             self.shape_5[key] += 1
             self.shape_4[key] += 1
+            self._alias_dirty.update((id(self.shape_4), id(self.shape_5), id(self.shape_6)))
+            peso = _LUT_PESO_4 + _LUT_PESO_5 + _LUT_PESO_6
         elif pontos >= 5:
             self.shape_5[key] += 1
             self.shape_4[key] += 1
+            self._alias_dirty.update((id(self.shape_4), id(self.shape_5)))
+            peso = _LUT_PESO_4 + _LUT_PESO_5
         elif pontos >= 4:
             self.shape_4[key] += 1
+            self._alias_dirty.add(id(self.shape_4))
+            peso = _LUT_PESO_4
 
         self.total_learns += 1
+        # tabela mantida em dia aqui (empacota só esta chave); rebuild completo só no _rebuild_from_state
+        if peso and self._score_lut is not None:
+            try:
+                packed = _pack_shape_key(key)
+            except (ValueError, KeyError, IndexError):
+                packed = None
+            if packed is not None:
+                self._score_lut[packed] = self._score_lut.get(packed, 0.0) + peso
 
         # performance por concurso (leve)
         self._perf_update(concurso=int(concurso_n), pontos=int(pontos), jogos_gerados=1)
 
-        # autosave leve (micro-melhoria): salva a cada X learns
+        # autosave leve (micro-melhoria): salva a cada X learns, sem repetir em rajadas
         # (o Hub também salva periodicamente, mas isso protege contra crash)
-        if self.total_learns % 250 == 0:
+        self._learns_since_save += 1
+        if (
+            self._learns_since_save >= _AUTOSAVE_LEARNS
+            and time.monotonic() - self._last_save >= _AUTOSAVE_MIN_SEG
+        ):
             self.save_state()
 
     # --------------------------
@@ -176,22 +438,52 @@ class StructuralPatternShapeBrain(BaseBrain):
     # --------------------------
     def save_state(self) -> None:
         self.state = {
+            "fmt_version": _STATE_FMT_VERSION,
             "total_learns": int(self.total_learns),
-            "shape_4": dict(self.shape_4),
-            "shape_5": dict(self.shape_5),
-            "shape_6": dict(self.shape_6),
         }
+        _counter_to_state(self.shape_4, "shape_4", self.state)
+        _counter_to_state(self.shape_5, "shape_5", self.state)
+        _counter_to_state(self.shape_6, "shape_6", self.state)
         super().save_state()
+        self._learns_since_save = 0
+        self._last_save = time.monotonic()
 
     def load_state(self) -> None:
         super().load_state()
 
+    def _alias_for(self, source: Counter) -> Tuple[List[str], List[float], List[int]]:
+        sid = id(source)
+        cached = self._alias_cache.get(sid)
+        if cached is None or sid in self._alias_dirty:
+            keys = list(source.keys())
+            prob, alias = _build_alias([max(1.0, float(source[k])) for k in keys])
+            cached = (keys, prob, alias)
+            self._alias_cache[sid] = cached
+            self._alias_dirty.discard(sid)
+        return cached
+
+    def _score_lookup(self) -> Dict[int, float]:
+        if self._score_lut is None:
+            lut: Dict[int, float] = {}
+            for counter, peso in ((self.shape_4, _LUT_PESO_4), (self.shape_5, _LUT_PESO_5), (self.shape_6, _LUT_PESO_6)):
+                for key, count in counter.items():
+                    try:
+                        packed = _pack_shape_key(key)
+                    except (ValueError, KeyError, IndexError):
+                        continue
+                    lut[packed] = lut.get(packed, 0.0) + peso * float(count)
+            self._score_lut = lut
+        return self._score_lut
+
     def _rebuild_from_state(self) -> None:
+        self._score_lut = None
+        self._alias_cache = {}
+        self._alias_dirty = set()
         try:
             self.total_learns = int(self.state.get("total_learns", 0))
-            self.shape_4 = Counter(self.state.get("shape_4", {}) or {})
-            self.shape_5 = Counter(self.state.get("shape_5", {}) or {})
-            self.shape_6 = Counter(self.state.get("shape_6", {}) or {})
+            self.shape_4 = _counter_from_state(self.state, "shape_4")
+            self.shape_5 = _counter_from_state(self.state, "shape_5")
+            self.shape_6 = _counter_from_state(self.state, "shape_6")
         except Exception:
             self.total_learns = 0
             self.shape_4 = Counter()
@@ -235,9 +527,9 @@ class StructuralPatternShapeBrain(BaseBrain):
                 band = band
 
         # pools por faixa
-        pools = [[x for x in UNIVERSO if faixa[0] <= x <= faixa[1]] for faixa in FAIXAS]
+        pools = _POOLS
 
-        jogo: List[int] = []
+        mask = 0
 
         # 1) respeita distribuição por faixas (se passar do tamanho, ajusta)
         target = list(band)
@@ -259,68 +551,19 @@ class StructuralPatternShapeBrain(BaseBrain):
         for pool, k in zip(pools, target):
             if k <= 0:
                 continue
-            picks = random.sample(pool, min(k, len(pool)))
-            jogo.extend(picks)
+            for x in random.sample(pool, min(k, len(pool))):
+                mask |= 1 << x
 
-        # 2) se ainda faltou (por falta no pool), completa
-        jogo = list(dict.fromkeys(jogo))  # remove duplicatas mantendo ordem
-        while len(jogo) < size:
-            x = random.choice(UNIVERSO)
-            if x not in jogo:
-                jogo.append(x)
+        # 2) se ainda faltou (por falta no pool), completa de uma vez com o resíduo
+        need = size - mask.bit_count()
+        if need > 0:
+            for x in random.sample(_dezenas_of(_FULL_MASK & ~mask), need):
+                mask |= 1 << x
 
         # 3) ajusta paridade (aproximado) via swaps
-        jogo = sorted(jogo)
-        for _ in range(20):
-            cur_even = count_even(jogo)
-            if cur_even == ev:
-                break
-            if cur_even < ev:
-                # trocar um ímpar por par
-                odds = [x for x in jogo if x % 2 == 1]
-                evens_pool = [x for x in UNIVERSO if x % 2 == 0 and x not in jogo]
-                if not odds or not evens_pool:
-                    break
-                jogo.remove(random.choice(odds))
-                jogo.append(random.choice(evens_pool))
-            else:
-                # trocar um par por ímpar
-                evens = [x for x in jogo if x % 2 == 0]
-                odds_pool = [x for x in UNIVERSO if x % 2 == 1 and x not in jogo]
-                if not evens or not odds_pool:
-                    break
-                jogo.remove(random.choice(evens))
-                jogo.append(random.choice(odds_pool))
-            jogo = sorted(jogo)
+        mask = _repair_parity(mask, ev)
 
         # 4) evita sequência muito grande (run) com pequenos swaps
-        for _ in range(25):
-            if max_consecutive_run(jogo) <= run:
-                break
-            # remove um número do meio de uma sequência e substitui por outro distante
-            candidates_remove = jogo[:]
-            random.shuffle(candidates_remove)
-            removed = None
-            for r in candidates_remove:
-                temp = [x for x in jogo if x != r]
-                if max_consecutive_run(temp) < max_consecutive_run(jogo):
-                    removed = r
-                    jogo = temp
-                    break
-            if removed is None:
-                break
-            # adiciona um número fora do jogo e que não crie sequência grande
-            pool = [x for x in UNIVERSO if x not in jogo]
-            random.shuffle(pool)
-            for x in pool:
-                temp = sorted(jogo + [x])
-                if max_consecutive_run(temp) <= run:
-                    jogo = temp
-                    break
-            # garante tamanho
-            while len(jogo) < size:
-                x = random.choice([u for u in UNIVERSO if u not in jogo])
-                jogo.append(x)
-                jogo = sorted(jogo)
+        mask = _repair_runs(mask, run, size)
 
-        return sorted(jogo)
+        return _dezenas_of(mask)
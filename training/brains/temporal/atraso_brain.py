@@ -1,12 +1,27 @@
 # training/brains/temporal/atraso_brain.py
 from __future__ import annotations
 
-from typing import Any, Dict, List
-import random
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
 
 from training.core.base_brain import BaseBrain
 from config.game import DIA_DE_SORTE_RULES
-from training.brains._utils import UNIVERSO, weighted_sample_without_replacement
+from training.brains._utils import UNIVERSO, UNIVERSO_ARR, UNIVERSO_MAX, np_rng
+
+
+def _first_unique_mask(cand: np.ndarray, size: int) -> np.ndarray:
+    """
+    Máscara (n, w) das primeiras `size` dezenas distintas de cada linha, na ordem da linha.
+    argsort estável: entre valores iguais a primeira posição vem antes -> é a "primeira ocorrência".
+    """
+    order = np.argsort(cand, axis=1, kind="stable")
+    vals = np.take_along_axis(cand, order, axis=1)
+    first_sorted = np.ones(cand.shape, dtype=bool)
+    first_sorted[:, 1:] = vals[:, 1:] != vals[:, :-1]
+    first = np.zeros(cand.shape, dtype=bool)
+    np.put_along_axis(first, order, first_sorted, axis=1)
+    return first & (np.cumsum(first, axis=1) <= size)
 
 
 class TemporalAtrasoBrain(BaseBrain):
@@ -27,9 +42,17 @@ class TemporalAtrasoBrain(BaseBrain):
             version=version,
         )
 
-        # concurso onde cada dezena apareceu por último
-        self.last_seen: Dict[int, int] = {d: 0 for d in UNIVERSO}
+        # concurso onde cada dezena apareceu por último (índice = dezena; 0 não usado)
+        self._last_seen_arr = np.zeros(UNIVERSO_MAX + 1, dtype=np.int64)
+        # dezenas alteradas desde o último save (persistidas em cerebro_estado_kv)
+        self._last_seen_dirty: Set[int] = set()
         self.ultimo_concurso_visto: int = 0
+        # gerador NumPy do cérebro: criado uma vez (semeado pelo random global -> --seed continua valendo)
+        self._rng = np_rng()
+        # (concurso_ref, atrasos, ranking): o Hub chama generate para vários tamanhos no mesmo concurso
+        self._atrasos_cache: Optional[Tuple[int, np.ndarray, np.ndarray]] = None
+        # (ultimo_concurso_visto, top10): report() é lido em loop pelo painel/auditor
+        self._report_cache: Optional[Tuple[int, List[int]]] = None
 
         self.load_state()
         self._rebuild_from_state()
@@ -55,35 +78,40 @@ class TemporalAtrasoBrain(BaseBrain):
         if concurso_ref <= 0:
             concurso_ref = self.ultimo_concurso_visto or 1
 
-        # atraso = concurso_ref - last_seen
-        atrasos = {d: max(0, concurso_ref - int(self.last_seen.get(d, 0))) for d in UNIVERSO}
-        ranked = sorted(UNIVERSO, key=lambda d: atrasos[d], reverse=True)
+        # atraso = concurso_ref - last_seen (vetorizado; índice = dezena)
+        atrasos, ranked = self._atrasos_ranked(concurso_ref)
 
         # core de atrasadas
         core_size = max(size + 4, int(round(len(UNIVERSO) * 0.6)))
-        core = ranked[:core_size] if ranked else UNIVERSO[:]
-
-        jogos: List[List[int]] = []
-        for _ in range(n):
-            jogo = set()
-
-            # pega ~50% do jogo do core (ponderado por atraso)
-            k_core = max(0, min(len(core), int(round(size * 0.50))))
-            if k_core > 0:
-                weights = {d: float(atrasos.get(d, 0) + 1.0) for d in core}
-                picks = weighted_sample_without_replacement(weights, k_core)
-                jogo.update(picks)
+        core_arr = ranked[:core_size]
 
-            # completa com mistura: parte universo, parte core (diversidade)
-            while len(jogo) < size:
-                if random.random() < 0.55 and core:
-                    jogo.add(random.choice(core))
-                else:
-                    jogo.add(random.choice(UNIVERSO))
+        # pega ~50% de cada jogo do core, ponderado por atraso, sem reposição:
+        # Gumbel-top-k -> os k maiores de log(w) + Gumbel(0,1) (todos os jogos numa matriz só)
+        if n <= 0:
+            return []
+        rng = self._rng
+        k_core = max(0, min(len(core_arr), int(round(size * 0.50))))
+        if k_core > 0:
+            log_w = np.log(atrasos[core_arr].astype(np.float64) + 1.0)
+            keys = log_w + rng.gumbel(size=(n, len(core_arr)))
+            cand = core_arr[np.argpartition(-keys, k_core - 1, axis=1)[:, :k_core]]
+        else:
+            cand = np.empty((n, 0), dtype=np.int64)
 
-            jogos.append(sorted(jogo))
+        # completa com mistura: parte universo, parte core (diversidade).
+        # sorteia blocos (n, 2*size) de candidatos e fica com as primeiras dezenas
+        # distintas de cada linha; se alguma linha não fechar, sorteia mais um bloco
+        largura = 2 * size
+        while True:
+            do_core = rng.random((n, largura)) < 0.55
+            de_core = core_arr[rng.integers(0, len(core_arr), size=(n, largura))]
+            de_universo = UNIVERSO_ARR[rng.integers(0, len(UNIVERSO_ARR), size=(n, largura))]
+            cand = np.concatenate([cand, np.where(do_core, de_core, de_universo)], axis=1)
+            keep = _first_unique_mask(cand, size)
+            if (keep.sum(axis=1) >= size).all():
+                break
 
-        return jogos
+        return np.sort(cand[keep].reshape(n, size), axis=1).tolist()
 
     def score_game(self, jogo: List[int], context: Dict[str, Any]) -> float:
         """
@@ -97,13 +125,25 @@ class TemporalAtrasoBrain(BaseBrain):
         if concurso_ref <= 0:
             concurso_ref = self.ultimo_concurso_visto or 1
 
-        s = 0.0
-        for d in jogo:
-            s += float(max(0, concurso_ref - int(self.last_seen.get(int(d), 0))))
+        arr = np.asarray(jogo, dtype=np.int64)
+        s = float(np.maximum(0, concurso_ref - self._last_seen_arr[arr]).sum())
 
         # normalização simples: divide por um fator fixo
         return s / (float(len(jogo)) * float(DIA_DE_SORTE_RULES.universo_max))
 
+    def score_batch(self, jogos_2d: np.ndarray, context: Dict[str, Any]) -> np.ndarray:
+        """score_game de todos os jogos de uma vez: soma dos atrasos por linha"""
+        jogos = np.asarray(jogos_2d, dtype=np.int64)
+        if jogos.size == 0:
+            return np.zeros(len(jogos), dtype=np.float64)
+
+        concurso_ref = int(context.get("concurso_n", self.ultimo_concurso_visto or 0))
+        if concurso_ref <= 0:
+            concurso_ref = self.ultimo_concurso_visto or 1
+
+        s = self._atrasos(concurso_ref)[jogos].sum(axis=1).astype(np.float64)
+        return s / (float(jogos.shape[1]) * float(DIA_DE_SORTE_RULES.universo_max))
+
     def learn(
         self,
         concurso_n: int,
@@ -119,8 +159,10 @@ class TemporalAtrasoBrain(BaseBrain):
             return
 
         concurso_n1 = int(concurso_n) + 1
-        for d in resultado_n1:
-            self.last_seen[int(d)] = concurso_n1
+        self._last_seen_arr[np.asarray(resultado_n1, dtype=np.int64)] = concurso_n1
+        self._last_seen_dirty.update(int(d) for d in resultado_n1)
+        self._atrasos_cache = None
+        self._report_cache = None
 
         if concurso_n1 > self.ultimo_concurso_visto:
             self.ultimo_concurso_visto = concurso_n1
@@ -128,15 +170,33 @@ class TemporalAtrasoBrain(BaseBrain):
         # registra performance por concurso (leve)
         self._perf_update(concurso=int(concurso_n), pontos=int(pontos), jogos_gerados=1)
 
+    def learn_batch(
+        self,
+        concurso_n: int,
+        jogos: List[List[int]],
+        resultado_n1: List[int],
+        pontos: List[int],
+        context: Dict[str, Any],
+    ) -> None:
+        # o estado só depende do resultado (igual para todos os jogos do concurso): atualiza uma vez
+        if not resultado_n1 or not jogos:
+            return
+        self.learn(concurso_n, jogos[0], resultado_n1, pontos[0], context)
+        self._perf_update_batch(concurso=int(concurso_n), pontos=[int(p) for p in pontos[1:]])
+
     # ==========================
     # PERSISTÊNCIA (BaseBrain)
     # ==========================
     def save_state(self) -> None:
+        # last_seen vai linha a linha (só as dezenas que mudaram); o JSON fica só com o escalar
         self.state = {
             "ultimo_concurso_visto": int(self.ultimo_concurso_visto),
-            "last_seen": {str(k): int(v) for k, v in self.last_seen.items()},
         }
+        if self._last_seen_dirty:
+            dirty = sorted(self._last_seen_dirty)
+            self._kv_write((f"last_seen:{d}", int(v)) for d, v in zip(dirty, self._last_seen_arr[dirty].tolist()))
         super().save_state()
+        self._last_seen_dirty = set()
 
     def load_state(self) -> None:
         super().load_state()
@@ -144,26 +204,61 @@ class TemporalAtrasoBrain(BaseBrain):
     # ==========================
     # HELPERS
     # ==========================
+    @property
+    def last_seen(self) -> Dict[int, int]:
+        # visão dict do array (serialização/relatórios)
+        return {d: int(v) for d, v in zip(UNIVERSO, self._last_seen_arr[UNIVERSO_ARR].tolist())}
+
+    def _atrasos(self, concurso_ref: int) -> np.ndarray:
+        return np.maximum(0, int(concurso_ref) - self._last_seen_arr)
+
+    def _ranked(self, atrasos: np.ndarray) -> np.ndarray:
+        # mais atrasadas primeiro; empate mantém a ordem do universo (sort estável)
+        order = np.argsort(-atrasos[UNIVERSO_ARR], kind="stable")
+        return UNIVERSO_ARR[order]
+
+    def _atrasos_ranked(self, concurso_ref: int) -> Tuple[np.ndarray, np.ndarray]:
+        cached = self._atrasos_cache
+        if cached is None or cached[0] != concurso_ref:
+            atrasos = self._atrasos(concurso_ref)
+            cached = (concurso_ref, atrasos, self._ranked(atrasos))
+            self._atrasos_cache = cached
+        return cached[1], cached[2]
+
     def _rebuild_from_state(self) -> None:
+        arr = np.zeros(UNIVERSO_MAX + 1, dtype=np.int64)
+        dirty: Set[int] = set()
         try:
             self.ultimo_concurso_visto = int(self.state.get("ultimo_concurso_visto", self.ultimo_concurso_visto))
+            # formato antigo: dict inteiro no JSON -> migra para o kv no próximo save
             raw = self.state.get("last_seen", {}) or {}
-            self.last_seen = {int(k): int(v) for k, v in raw.items()}
-
-            # garante universo completo
-            for d in UNIVERSO:
-                if d not in self.last_seen:
-                    self.last_seen[d] = 0
+            for k, v in raw.items():
+                d = int(k)
+                if 0 < d <= UNIVERSO_MAX:
+                    arr[d] = int(v)
+                    dirty.add(d)
+            for chave, v in self._kv_load().items():
+                prefixo, _, dezena = chave.partition(":")
+                if prefixo == "last_seen" and 0 < int(dezena) <= UNIVERSO_MAX:
+                    arr[int(dezena)] = int(v)
+                    dirty.discard(int(dezena))
         except Exception:
             self.ultimo_concurso_visto = 0
-            self.last_seen = {d: 0 for d in UNIVERSO}
+            arr[:] = 0
+            dirty = set()
+        self._last_seen_arr = arr
+        self._last_seen_dirty = dirty
+        self._atrasos_cache = None
+        self._report_cache = None
 
     def report(self) -> Dict[str, Any]:
         concurso_ref = self.ultimo_concurso_visto or 0
-        atrasos = {d: max(0, concurso_ref - int(self.last_seen.get(d, 0))) for d in UNIVERSO}
-        ranked = sorted(UNIVERSO, key=lambda d: atrasos[d], reverse=True)
+        cached = self._report_cache
+        if cached is None or cached[0] != concurso_ref:
+            cached = (concurso_ref, self._atrasos_ranked(concurso_ref)[1][:10].tolist())
+            self._report_cache = cached
         return {
             **super().report(),
             "ultimo_concurso_visto": int(self.ultimo_concurso_visto),
-            "top10_atrasadas": ranked[:10],
+            "top10_atrasadas": list(cached[1]),
         }
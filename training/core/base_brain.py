@@ -2,16 +2,128 @@
 from __future__ import annotations
 
 import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 from config.game import DIA_DE_SORTE_RULES
 from training.core.brain_interface import BrainInterface
 
+try:  # orjson é opcional: serialização do estado 2-5x mais rápida
+    import orjson
+except ImportError:
+    orjson = None
+
+@lru_cache(maxsize=1)
+def _fmt_segundo(segundo: int) -> str:
+    return datetime.fromtimestamp(segundo).strftime("%Y-%m-%d %H:%M:%S")
+
+
 def now() -> str:
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # strftime só quando o segundo muda
+    return _fmt_segundo(int(time.time()))
+
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def _dump_state(state: Dict[str, Any]) -> str:
+        # grava como TEXT (não bytes): BLOB cru quebraria o jsonb(?) e leitores antigos
+        return orjson.dumps(state, option=_ORJSON_OPTS).decode("utf-8")
+
+    _load_state = orjson.loads
+else:
+    def _dump_state(state: Dict[str, Any]) -> str:
+        return json.dumps(state, ensure_ascii=False)
+
+    _load_state = json.loads
+
+# tiers de acerto da performance (fixos pela regra do jogo): vetor + SQL montados uma vez
+_TIERS = tuple(DIA_DE_SORTE_RULES.performance_tiers)
+_TIERS_ARR = np.asarray(_TIERS, dtype=np.int64)
+_TIER_COLS = tuple(f"qtd_{tier}" for tier in _TIERS)
+
+# estado em JSONB (BLOB pré-parseado, SQLite >= 3.45): opt-in via IA_STATE_JSONB=1,
+# porque um banco gravado em JSONB não abre num SQLite antigo (o .db é versionado/compartilhado)
+_SQLITE_TEM_JSONB = sqlite3.sqlite_version_info >= (3, 45, 0)
+_STATE_JSONB = os.getenv("IA_STATE_JSONB") == "1" and _SQLITE_TEM_JSONB
+_STATE_VALUE_SQL = "jsonb(?)" if _STATE_JSONB else "?"
+# com JSONB ligado, json() devolve texto de TEXT ou JSONB; sem ele lê a coluna crua (sem re-parse no SQLite)
+_STATE_SELECT_SQL = (
+    "SELECT json(estado_json) FROM cerebro_estado WHERE cerebro_id=?"
+    if _STATE_JSONB
+    else "SELECT estado_json FROM cerebro_estado WHERE cerebro_id=?"
+)
+
+_STATE_UPSERT_SQL = f"""
+INSERT INTO cerebro_estado (cerebro_id, estado_json, atualizado_em)
+VALUES (?, {_STATE_VALUE_SQL}, ?)
+ON CONFLICT(cerebro_id) DO UPDATE SET
+    estado_json=excluded.estado_json,
+    atualizado_em=excluded.atualizado_em
+"""
+_CEREBRO_TOUCH_SQL = "UPDATE cerebros SET atualizado_em=?, versao=?, habilitado=? WHERE id=?"
+
+# estado em linhas (delta): bancos antigos podem não ter a tabela -> cria sob demanda
+_KV_DDL = """
+CREATE TABLE IF NOT EXISTS cerebro_estado_kv (
+    cerebro_id INTEGER NOT NULL,
+    chave TEXT NOT NULL,
+    valor INTEGER NOT NULL,
+    PRIMARY KEY (cerebro_id, chave),
+    FOREIGN KEY (cerebro_id) REFERENCES cerebros(id)
+)
+"""
+
+# upsert acumulativo: soma jogos/qtds e recalcula a média ponderada com a linha existente
+_PERF_UPSERT_SQL = (
+    "INSERT INTO cerebro_performance "
+    f"({', '.join(('cerebro_id', 'concurso', 'jogos_gerados', 'media_pontos') + _TIER_COLS + ('atualizado_em',))}) "
+    f"VALUES ({','.join(['?'] * (5 + len(_TIER_COLS)))}) "
+    "ON CONFLICT(cerebro_id, concurso) DO UPDATE SET "
+    "media_pontos=(cerebro_performance.media_pontos * cerebro_performance.jogos_gerados"
+    " + excluded.media_pontos * excluded.jogos_gerados)"
+    " / (cerebro_performance.jogos_gerados + excluded.jogos_gerados), "
+    "jogos_gerados=cerebro_performance.jogos_gerados + excluded.jogos_gerados, "
+    + ", ".join(f"{c}=cerebro_performance.{c} + excluded.{c}" for c in _TIER_COLS)
+    + ", atualizado_em=excluded.atualizado_em"
+)
+
+def _commit(db_conn) -> None:
+    """commit dos cérebros, a menos que o chamador seja dono da transação (BaseBrain.hold_commits)"""
+    if BaseBrain._commit_owner is not db_conn:
+        db_conn.commit()
+
 
 class BaseBrain(BrainInterface):
+    # generate/score_game podem rodar numa cópia do cérebro em outro processo (sem conexão)?
+    parallel_generate: bool = True
+
+    # save em lote (BrainHub.save_all): (conn, linhas estado, linhas cerebros) ou None
+    _save_batch: Optional[Tuple[Any, List[Tuple[Any, ...]], List[Tuple[Any, ...]]]] = None
+
+    # conexão cuja transação pertence ao chamador (hold_commits): cérebros escrevem mas não comitam
+    _commit_owner: Any = None
+
+    # cerebros pré-carregado por conexão: id(conn) -> (conn, {brain_id: (pk, habilitado)})
+    _registry: Dict[int, Tuple[Any, Dict[str, Tuple[int, bool]]]] = {}
+
+    @classmethod
+    def preload_registry(cls, db_conn) -> Dict[str, Tuple[int, bool]]:
+        """um SELECT só para todos os cérebros; _ensure_registered passa a consultar este cache"""
+        cur = db_conn.cursor()
+        cur.execute("SELECT brain_id, id, habilitado FROM cerebros")
+        registry = {str(bid): (int(pk), bool(int(hab))) for bid, pk, hab in cur.fetchall()}
+        # guarda só a conexão mais recente (as antigas caem no caminho normal, com SELECT)
+        BaseBrain._registry = {id(db_conn): (db_conn, registry)}
+        return registry
+
     def __init__(self, db_conn, brain_id: str, name: str, category: str, version: str = "1.0"):
         self.db = db_conn
         self.id = brain_id
@@ -22,122 +134,199 @@ class BaseBrain(BrainInterface):
 
         self._cerebro_pk: Optional[int] = None
         self.state: Dict[str, Any] = {}
+        # performance acumulada em memória até o próximo flush: concurso -> [jogos, soma_pontos, qtds...]
+        self._perf_buffer: Dict[int, List[Any]] = {}
+        self._kv_ready = False
 
         self._ensure_registered()
 
+    @classmethod
+    @contextmanager
+    def batched_save(cls, db_conn) -> Iterator[None]:
+        """
+        Agrupa os save_state dos cérebros desta conexão: estado e cerebros vão
+        em dois executemany e um único commit no fim do bloco.
+        """
+        if BaseBrain._save_batch is not None:
+            yield
+            return
+        batch: Tuple[Any, List[Tuple[Any, ...]], List[Tuple[Any, ...]]] = (db_conn, [], [])
+        BaseBrain._save_batch = batch
+        try:
+            yield
+        finally:
+            BaseBrain._save_batch = None
+        cur = db_conn.cursor()
+        if batch[1]:
+            cur.executemany(_STATE_UPSERT_SQL, batch[1])
+        if batch[2]:
+            cur.executemany(_CEREBRO_TOUCH_SQL, batch[2])
+        _commit(db_conn)
+
+    @classmethod
+    @contextmanager
+    def hold_commits(cls, db_conn) -> Iterator[None]:
+        """
+        Dentro do bloco, save_state/flush_perf/batched_save desta conexão só escrevem:
+        o commit fica com quem abriu o bloco (ex.: trainer, junto do checkpoint).
+        """
+        anterior = BaseBrain._commit_owner
+        BaseBrain._commit_owner = db_conn
+        try:
+            yield
+        finally:
+            BaseBrain._commit_owner = anterior
+
     def _ensure_registered(self) -> None:
+        entry = BaseBrain._registry.get(id(self.db))
+        registry = entry[1] if entry is not None and entry[0] is self.db else None
+        if registry is not None and self.id in registry:
+            self._cerebro_pk, self.enabled = registry[self.id]
+            return
+
+        ts = now()
         cur = self.db.cursor()
         cur.execute(
             """
             INSERT OR IGNORE INTO cerebros (brain_id, nome, categoria, versao, habilitado, criado_em, atualizado_em)
             VALUES (?, ?, ?, ?, 1, ?, ?)
             """,
-            (self.id, self.name, self.category, self.version, now(), now())
+            (self.id, self.name, self.category, self.version, ts, ts)
         )
-        self.db.commit()
+        _commit(self.db)
 
         cur.execute("SELECT id, habilitado FROM cerebros WHERE brain_id = ?", (self.id,))
         row = cur.fetchone()
         if row:
             self._cerebro_pk = int(row[0])
             self.enabled = bool(int(row[1]))
+            if registry is not None:
+                registry[self.id] = (self._cerebro_pk, self.enabled)
 
     def save_state(self) -> None:
         if self._cerebro_pk is None:
             self._ensure_registered()
 
+        ts = now()
         cur = self.db.cursor()
-        payload = json.dumps(self.state, ensure_ascii=False)
+        payload = _dump_state(self.state)
+        state_row = (self._cerebro_pk, payload, ts)
+        touch_row = (ts, self.version, 1 if self.enabled else 0, self._cerebro_pk)
 
-        cur.execute(
-            """
-            INSERT INTO cerebro_estado (cerebro_id, estado_json, atualizado_em)
-            VALUES (?, ?, ?)
-            ON CONFLICT(cerebro_id) DO UPDATE SET
-                estado_json=excluded.estado_json,
-                atualizado_em=excluded.atualizado_em
-            """,
-            (self._cerebro_pk, payload, now())
-        )
+        batch = BaseBrain._save_batch
+        if batch is not None and batch[0] is self.db:
+            # dentro de batched_save: grava no fim, junto com os outros cérebros
+            batch[1].append(state_row)
+            batch[2].append(touch_row)
+            self._write_perf(cur)
+            return
 
-        cur.execute(
-            """
-            UPDATE cerebros SET atualizado_em=?, versao=?, habilitado=?
-            WHERE id=?
-            """,
-            (now(), self.version, 1 if self.enabled else 0, self._cerebro_pk)
-        )
-        self.db.commit()
+        cur.execute(_STATE_UPSERT_SQL, state_row)
+        cur.execute(_CEREBRO_TOUCH_SQL, touch_row)
+        self._write_perf(cur)
+        _commit(self.db)
 
     def load_state(self) -> None:
         if self._cerebro_pk is None:
             self._ensure_registered()
 
         cur = self.db.cursor()
-        cur.execute("SELECT estado_json FROM cerebro_estado WHERE cerebro_id=?", (self._cerebro_pk,))
-        row = cur.fetchone()
+        try:
+            cur.execute(_STATE_SELECT_SQL, (self._cerebro_pk,))
+            row = cur.fetchone()
+        except sqlite3.Error:
+            # json() em valor malformado/vazio: mesmo fallback do parse abaixo
+            row = None
         if not row:
             self.state = {}
             return
         try:
-            self.state = json.loads(row[0])
+            valor = row[0]
+            if isinstance(valor, bytes) and _SQLITE_TEM_JSONB:
+                # BLOB JSONB gravado por outra máquina com IA_STATE_JSONB=1: converte só este valor
+                valor = cur.execute("SELECT json(?)", (valor,)).fetchone()[0]
+            self.state = _load_state(valor)
         except Exception:
             self.state = {}
 
-    def _perf_update(self, concurso: int, pontos: int, jogos_gerados: int = 1) -> None:
-        """registra performance por concurso (leve)"""
+    def _kv_load(self) -> Dict[str, int]:
+        """linhas de cerebro_estado_kv deste cérebro (chave -> valor)"""
         if self._cerebro_pk is None:
             self._ensure_registered()
+        cur = self.db.cursor()
+        self._ensure_kv(cur)
+        cur.execute("SELECT chave, valor FROM cerebro_estado_kv WHERE cerebro_id=?", (self._cerebro_pk,))
+        return {str(k): int(v) for k, v in cur.fetchall()}
 
+    def _kv_write(self, items: Iterable[Tuple[str, int]]) -> None:
+        """grava só as chaves informadas (sem commit: vai junto do save_state)"""
+        if self._cerebro_pk is None:
+            self._ensure_registered()
         cur = self.db.cursor()
-        # busca existente
-        tiers = DIA_DE_SORTE_RULES.performance_tiers
-        col_names = ", ".join([f"qtd_{tier}" for tier in tiers])
-        update_cols = ", ".join([f"qtd_{tier}=?" for tier in tiers])
-        cur.execute(
-            f"SELECT jogos_gerados, media_pontos, {col_names} FROM cerebro_performance WHERE cerebro_id=? AND concurso=?",
-            (self._cerebro_pk, int(concurso))
+        self._ensure_kv(cur)
+        cur.executemany(
+            "INSERT OR REPLACE INTO cerebro_estado_kv (cerebro_id, chave, valor) VALUES (?, ?, ?)",
+            [(self._cerebro_pk, str(k), int(v)) for k, v in items],
         )
-        row = cur.fetchone()
 
-        if row:
-            jg = int(row[0])
-            media = float(row[1])
-            qtds = [int(x) for x in row[2:]]
-            jg = int(jg) + int(jogos_gerados)
-            media = (float(media) * (jg - jogos_gerados) + pontos) / jg
-            qtds = [
-                qtd + (1 if pontos >= tier else 0)
-                for qtd, tier in zip(qtds, tiers)
-            ]
-
-            update_sql = (
-                "UPDATE cerebro_performance "
-                f"SET jogos_gerados=?, media_pontos=?, {update_cols}, atualizado_em=? "
-                "WHERE cerebro_id=? AND concurso=?"
-            )
-            cur.execute(update_sql, (jg, media, *qtds, now(), self._cerebro_pk, int(concurso)))
+    def _ensure_kv(self, cur) -> None:
+        if not self._kv_ready:
+            cur.execute(_KV_DDL)
+            self._kv_ready = True
+
+    def _perf_update(self, concurso: int, pontos: int, jogos_gerados: int = 1) -> None:
+        """registra performance por concurso (leve): acumula em memória, grava no flush_perf/save_state"""
+        # acertou cada tier? comparação vetorizada, sem if por tier
+        hit = (int(pontos) >= _TIERS_ARR).astype(np.int64)
+
+        acc = self._perf_buffer.get(int(concurso))
+        if acc is None:
+            self._perf_buffer[int(concurso)] = [int(jogos_gerados), float(pontos), hit]
+        else:
+            acc[0] += int(jogos_gerados)
+            acc[1] += float(pontos)
+            acc[2] = acc[2] + hit
+
+    def _perf_update_batch(self, concurso: int, pontos: List[int]) -> None:
+        """_perf_update de vários jogos do mesmo concurso de uma vez (um jogo por item de pontos)"""
+        if not pontos:
+            return
+        pts = np.asarray(pontos, dtype=np.int64)
+        hit = (pts[:, None] >= _TIERS_ARR).sum(axis=0)
+
+        acc = self._perf_buffer.get(int(concurso))
+        if acc is None:
+            self._perf_buffer[int(concurso)] = [len(pontos), float(pts.sum()), hit]
         else:
-            insert_cols = ", ".join(
-                ["cerebro_id", "concurso", "jogos_gerados", "media_pontos"] + [f"qtd_{tier}" for tier in tiers] + ["atualizado_em"]
-            )
-            placeholders = ",".join(["?"] * (4 + len(tiers) + 1))
-            insert_sql = f"INSERT INTO cerebro_performance ({insert_cols}) VALUES ({placeholders})"
-            cur.execute(
-                insert_sql,
-                (
-                    self._cerebro_pk,
-                    int(concurso),
-                    int(jogos_gerados),
-                    float(pontos),
-                    *[
-                        1 if pontos >= tier else 0
-                        for tier in tiers
-                    ],
-                    now(),
-                ),
-            )
-        self.db.commit()
+            acc[0] += len(pontos)
+            acc[1] += float(pts.sum())
+            acc[2] = acc[2] + hit
+
+    def flush_perf(self) -> None:
+        """grava a performance acumulada numa transação só (executemany)"""
+        if not self._perf_buffer:
+            return
+        self._write_perf(self.db.cursor())
+        _commit(self.db)
+
+    def _write_perf(self, cur) -> None:
+        if not self._perf_buffer:
+            return
+        if self._cerebro_pk is None:
+            self._ensure_registered()
+        ts = now()
+        rows = [
+            (self._cerebro_pk, concurso, jg, soma / jg if jg else 0.0, *qtds.tolist(), ts)
+            for concurso, (jg, soma, qtds) in self._perf_buffer.items()
+        ]
+        cur.executemany(_PERF_UPSERT_SQL, rows)
+        self._perf_buffer = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # conexão sqlite não é picklable: a cópia enviada a um worker vai sem banco
+        data = self.__dict__.copy()
+        data["db"] = None
+        return data
 
     def report(self) -> Dict[str, Any]:
         return {
@@ -2,10 +2,15 @@
 from __future__ import annotations
 
 from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
 import random
-from typing import Any, Dict, List, Set, Tuple
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
 
 from config.game import DIA_DE_SORTE_RULES
+from training.brains._utils import dezenas_mask
+from training.core.base_brain import BaseBrain
 from training.core.brain_interface import BrainInterface
 
 
@@ -16,6 +21,27 @@ def jaccard(a: List[int], b: List[int]) -> float:
     return inter / uni if uni else 0.0
 
 
+def _score_all(brain: BrainInterface, jogos: List[List[int]], context: Dict[str, Any]) -> List[float]:
+    # jogos do mesmo tamanho -> uma chamada score_batch (matriz); senão, um por um
+    if jogos and len({len(j) for j in jogos}) == 1:
+        return brain.score_batch(np.asarray(jogos, dtype=np.int64), context).tolist()
+    return [float(brain.score_game(j, context)) for j in jogos]
+
+
+def _generate_task(
+    brain: BrainInterface, context: Dict[str, Any], sizes: List[int], n: int, seed: int
+) -> Dict[int, Tuple[List[List[int]], List[float]]]:
+    """roda num worker: gera + pontua todos os tamanhos com uma cópia do cérebro (semente vem do processo principal)"""
+    random.seed(seed)
+    if isinstance(getattr(brain, "_rng", None), np.random.Generator):
+        brain._rng = np.random.default_rng(random.getrandbits(64))
+    out: Dict[int, Tuple[List[List[int]], List[float]]] = {}
+    for size in sizes:
+        jogos = brain.generate(context=context, size=size, n=n)
+        out[size] = (jogos, _score_all(brain, jogos, context))
+    return out
+
+
 class BrainHub:
     """
     BrainHub (linha única):
@@ -36,9 +62,12 @@ class BrainHub:
         consensus_enabled: bool = False,
         consensus_bonus: float = 0.0,
         consensus_min_votes: int = 2,
+        n_workers: int = 0,
     ):
         self.db = db_conn
         self.brains: List[BrainInterface] = []
+        # índice estável por brain_id (ordem de registro): agrupamentos vetorizados
+        self._brain_idx: Dict[str, int] = {}
         self.meta = defaultdict(lambda: {"usos": 0, "pontos": 0, "q6": 0, "q7": 0})
 
         self.exploration_rate = max(0.0, min(0.25, float(exploration_rate)))
@@ -51,6 +80,10 @@ class BrainHub:
         self.consensus_bonus = max(0.0, float(consensus_bonus))
         self.consensus_min_votes = max(2, int(consensus_min_votes))
 
+        # n_workers > 0: generate dos cérebros em paralelo (processos); 0 = sequencial
+        self.n_workers = max(0, int(n_workers))
+        self._pool: ProcessPoolExecutor | None = None
+
     def _meta_weight(self, brain_id: str) -> float:
         meta = self.meta.get(brain_id)
         if not meta:
@@ -68,40 +101,110 @@ class BrainHub:
 
     def register(self, brain: BrainInterface) -> None:
         self.brains.append(brain)
+        self._brain_idx.setdefault(str(brain.id), len(self._brain_idx))
 
     def load_all(self) -> None:
         for b in self.brains:
             b.load_state()
 
     def save_all(self) -> None:
+        # um commit só para todos os cérebros (estado + cerebros via executemany)
+        with BaseBrain.batched_save(self.db):
+            for b in self.brains:
+                b.save_state()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _ativos(self, context: Dict[str, Any]) -> List[Tuple[BrainInterface, float]]:
+        """(cérebro, relevância) dos habilitados com relevância > 0, na ordem de registro"""
+        ativos: List[Tuple[BrainInterface, float]] = []
         for b in self.brains:
-            b.save_state()
+            if not getattr(b, "enabled", True):
+                continue
+            rel = float(b.evaluate_context(context))
+            if rel > 0:
+                ativos.append((b, rel))
+        return ativos
+
+    def _submit_parallel(
+        self, ativos: List[Tuple[BrainInterface, float]], context: Dict[str, Any], sizes: List[int], per_brain: int
+    ) -> Dict[str, Future]:
+        """n_workers > 0: uma tarefa por cérebro paralelizável, com todos os tamanhos (cérebro vai ao pool uma vez)"""
+        futures: Dict[str, Future] = {}
+        if self.n_workers <= 0:
+            return futures
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.n_workers)
+        for b, _ in ativos:
+            if getattr(b, "parallel_generate", False):
+                # cópia do estado atual vai junto da tarefa: o worker nunca fica defasado
+                futures[str(b.id)] = self._pool.submit(
+                    _generate_task, b, context, sizes, per_brain, random.getrandbits(64)
+                )
+        return futures
 
-    def generate_candidates(self, context: Dict[str, Any], size: int, per_brain: int) -> List[Dict[str, Any]]:
+    def _collect(
+        self,
+        ativos: List[Tuple[BrainInterface, float]],
+        context: Dict[str, Any],
+        size: int,
+        per_brain: int,
+        futures: Dict[str, Future],
+    ) -> List[Tuple[BrainInterface, float, List[List[int]], List[float]]]:
+        """(cérebro, rel, jogos, scores) de um tamanho: resultado do pool ou generate local"""
+        out = []
+        for b, rel in ativos:
+            fut = futures.get(str(b.id))
+            # result() fica guardado no Future: os outros tamanhos do mesmo cérebro saem dele
+            pronto = fut.result().get(size) if fut is not None else None
+            if pronto is not None:
+                jogos, raws = pronto
+            else:
+                jogos = b.generate(context=context, size=size, n=per_brain)
+                raws = _score_all(b, jogos, context)
+            out.append((b, rel, jogos, raws))
+        return out
+
+    def _generate_all(
+        self, context: Dict[str, Any], size: int, per_brain: int
+    ) -> List[Tuple[BrainInterface, float, List[List[int]], List[float]]]:
+        """(cérebro, rel, jogos, scores) na ordem de registro; em paralelo quando n_workers > 0"""
+        ativos = self._ativos(context)
+        futures = self._submit_parallel(ativos, context, [int(size)], per_brain)
+        return self._collect(ativos, context, int(size), per_brain, futures)
+
+    def generate_candidates(
+        self,
+        context: Dict[str, Any],
+        size: int,
+        per_brain: int,
+        gerados: List[Tuple[BrainInterface, float, List[List[int]], List[float]]] | None = None,
+    ) -> List[Dict[str, Any]]:
         cand: List[Dict[str, Any]] = []
-        raw_scores: Dict[str, List[float]] = defaultdict(list)
+        bid_list: List[int] = []
 
-        votes_map: Dict[Tuple[int, ...], Set[str]] = defaultdict(set)
+        # chave = máscara de bits do jogo; valor = máscara de bits dos cérebros que o votaram
+        votes_map: Dict[int, int] = {}
 
-        for b in self.brains:
-            if not getattr(b, "enabled", True):
-                continue
-
-            rel = float(b.evaluate_context(context))
-            if rel <= 0:
-                continue
+        if gerados is None:
+            gerados = self._generate_all(context, size, per_brain)
 
-            jogos = b.generate(context=context, size=size, n=per_brain)
-            for j in jogos:
+        for b, rel, jogos, raws in gerados:
+            bidx = self._brain_idx.setdefault(str(b.id), len(self._brain_idx))
+            for j, raw in zip(jogos, raws):
                 jogo_sorted = tuple(sorted(j))
-                raw = float(b.score_game(j, context))
-                raw_scores[b.id].append(raw)
+                mask = dezenas_mask(jogo_sorted)
+                bid_list.append(bidx)
 
-                votes_map[jogo_sorted].add(b.id)
+                votes_map[mask] = votes_map.get(mask, 0) | (1 << bidx)
 
                 cand.append(
                     {
                         "jogo": list(jogo_sorted),
+                        "mask": mask,
                         "score_raw": raw,
                         "brain_id": b.id,
                         "rel": rel,
@@ -111,32 +214,36 @@ class BrainHub:
         if not cand:
             return []
 
-        score_bounds = {
-            brain_id: (min(scores), max(scores))
-            for brain_id, scores in raw_scores.items()
-            if scores
-        }
-
-        for c in cand:
-            min_s, max_s = score_bounds.get(c["brain_id"], (0.0, 0.0))
-            if max_s > min_s:
-                norm = (float(c["score_raw"]) - float(min_s)) / (float(max_s) - float(min_s))
-            else:
-                norm = 0.5
-
-            meta_weight = self._meta_weight(str(c["brain_id"]))
-            calibrated = (norm * 0.65 + float(c["rel"]) * 0.35) * meta_weight
-
-            noise = random.uniform(0.0, self.exploration_rate)
-            score = calibrated * (1.0 - self.exploration_rate) + noise
-
-            if self.consensus_enabled:
-                votes = len(votes_map.get(tuple(c["jogo"]), set()))
+        # normalização min-max por cérebro numa passada só (groupby via minimum.at/maximum.at)
+        nb = len(self._brain_idx)
+        bid_arr = np.asarray(bid_list, dtype=np.int64)
+        raw_arr = np.fromiter((c["score_raw"] for c in cand), dtype=np.float64, count=len(cand))
+        rel_arr = np.fromiter((c["rel"] for c in cand), dtype=np.float64, count=len(cand))
+        lo = np.full(nb, np.inf)
+        hi = np.full(nb, -np.inf)
+        np.minimum.at(lo, bid_arr, raw_arr)
+        np.maximum.at(hi, bid_arr, raw_arr)
+        lo_c, hi_c = lo[bid_arr], hi[bid_arr]
+        span = hi_c - lo_c
+        norm = np.full(len(cand), 0.5)
+        np.divide(raw_arr - lo_c, span, out=norm, where=span > 0)
+
+        id_of = {idx: bid for bid, idx in self._brain_idx.items()}
+        meta_arr = np.asarray([self._meta_weight(id_of[i]) for i in range(nb)], dtype=np.float64)
+        calibrated = (norm * 0.65 + rel_arr * 0.35) * meta_arr[bid_arr]
+
+        noise = np.random.default_rng(random.getrandbits(64)).uniform(0.0, self.exploration_rate, size=len(cand))
+        scores = calibrated * (1.0 - self.exploration_rate) + noise
+
+        if self.consensus_enabled:
+            for i, c in enumerate(cand):
+                votes = votes_map.get(c["mask"], 0).bit_count()
                 c["consensus_votes"] = votes
                 if votes >= self.consensus_min_votes:
-                    score += self.consensus_bonus
+                    scores[i] += self.consensus_bonus
 
-            c["score"] = float(score)
+        for c, score in zip(cand, scores.tolist()):
+            c["score"] = score
 
         return cand
 
@@ -149,10 +256,18 @@ class BrainHub:
     ) -> List[Dict[str, Any]]:
         candidatos.sort(key=lambda x: float(x["score"]), reverse=True)
         escolhidos: List[Dict[str, Any]] = []
+        escolhidos_masks: List[int] = []
         brain_counts: Dict[str, int] = defaultdict(int)
+        masks = [c.get("mask") or dezenas_mask(c["jogo"]) for c in candidatos]
+
+        # por candidato: maior jaccard já visto contra escolhidos[:conferidos[i]].
+        # escolhidos só cresce -> o máximo só sobe; ao relaxar o threshold, os pares
+        # antigos não são comparados de novo (só os escolhidos novos)
+        max_sim_visto = [0.0] * len(candidatos)
+        conferidos = [0] * len(candidatos)
 
         def pick_with_threshold(threshold: float) -> None:
-            for c in candidatos:
+            for i, c in enumerate(candidatos):
                 if len(escolhidos) >= top_n:
                     break
 
@@ -160,16 +275,31 @@ class BrainHub:
                 if brain_counts[bid] >= max_per_brain:
                     continue
 
-                jogo = c["jogo"]
-                ok = True
-                for e in escolhidos:
-                    if jaccard(jogo, e["jogo"]) >= threshold:
-                        ok = False
-                        break
+                best = max_sim_visto[i]
+                if best >= threshold:
+                    continue
 
-                if ok:
+                # jaccard por popcount nas máscaras (sem criar sets); para no primeiro parecido demais
+                m = masks[i]
+                k = conferidos[i]
+                while k < len(escolhidos_masks):
+                    em = escolhidos_masks[k]
+                    k += 1
+                    uni = (m | em).bit_count()
+                    sim = (m & em).bit_count() / uni if uni else 0.0
+                    if sim > best:
+                        best = sim
+                        if best >= threshold:
+                            break
+                max_sim_visto[i] = best
+                conferidos[i] = k
+
+                if best < threshold:
                     escolhidos.append(c)
+                    escolhidos_masks.append(m)
                     brain_counts[bid] += 1
+                    # já escolhido: nunca mais elegível (jaccard consigo mesmo = 1)
+                    max_sim_visto[i] = 1.0
 
         pick_with_threshold(float(max_sim))
 
@@ -180,8 +310,15 @@ class BrainHub:
 
         return escolhidos[:top_n]
 
-    def generate_games(self, context: Dict[str, Any], size: int, per_brain: int, top_n: int) -> List[Dict[str, Any]]:
-        candidatos = self.generate_candidates(context, size, per_brain)
+    def generate_games(
+        self,
+        context: Dict[str, Any],
+        size: int,
+        per_brain: int,
+        top_n: int,
+        gerados: List[Tuple[BrainInterface, float, List[List[int]], List[float]]] | None = None,
+    ) -> List[Dict[str, Any]]:
+        candidatos = self.generate_candidates(context, size, per_brain, gerados=gerados)
 
         # diversidade mais rígida para jogos maiores, mais leve para menores
         max_sim = 0.80 if int(size) >= 13 else 0.88
@@ -203,6 +340,30 @@ class BrainHub:
             max_per_brain=int(max_per_brain),
         )
 
+    def generate_games_multisize(
+        self, context: Dict[str, Any], sizes: Iterable[int], per_brain: int, top_n: int
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        generate_games para vários tamanhos do mesmo concurso.
+        Com n_workers > 0, cada cérebro vai ao pool uma vez com todos os tamanhos
+        (estado serializado uma vez por chamada, não uma vez por tamanho).
+        Retorna {tamanho: jogos}, na ordem de `sizes`.
+        """
+        sizes = [int(s) for s in sizes]
+        futures = self._submit_parallel(self._ativos(context), context, sizes, per_brain)
+
+        out: Dict[int, List[Dict[str, Any]]] = {}
+        try:
+            for size in sizes:
+                # relevância reavaliada por tamanho: generate pode mudar estado (ex.: elite sincroniza memória)
+                gerados = self._collect(self._ativos(context), context, size, per_brain, futures)
+                out[size] = self.generate_games(context, size, per_brain, top_n, gerados=gerados)
+        finally:
+            # tarefa ainda na fila (ex.: erro no meio do caminho): descarta
+            for fut in futures.values():
+                fut.cancel()
+        return out
+
     def learn(
         self,
         concurso_n: int,
@@ -224,3 +385,33 @@ class BrainHub:
             if b.id == brain_id:
                 b.learn(concurso_n, jogo, resultado_n1, pontos, context)
                 break
+
+    def learn_batch(
+        self,
+        concurso_n: int,
+        itens: List[Tuple[str, List[int], int]],
+        resultado_n1: List[int],
+        context: Dict[str, Any],
+    ) -> None:
+        """
+        learn de um concurso inteiro: itens = (brain_id, jogo, pontos) na ordem avaliada.
+        Meta atualizada item a item; cada cérebro recebe seus jogos numa chamada só (learn_batch).
+        """
+        por_brain: Dict[str, Tuple[List[List[int]], List[int]]] = {}
+        for brain_id, jogo, pontos in itens:
+            m = self.meta[str(brain_id)]
+            m["usos"] += 1
+            m["pontos"] += int(pontos)
+            if int(pontos) >= 6:
+                m["q6"] += 1
+            if int(pontos) >= 7:
+                m["q7"] += 1
+
+            jogos, pts = por_brain.setdefault(str(brain_id), ([], []))
+            jogos.append(jogo)
+            pts.append(int(pontos))
+
+        for b in self.brains:
+            grupo = por_brain.pop(str(b.id), None)
+            if grupo is not None:
+                b.learn_batch(concurso_n, grupo[0], resultado_n1, grupo[1], context)
@@ -4,6 +4,8 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List
 
+import numpy as np
+
 class BrainInterface(ABC):
     id: str
     name: str
@@ -23,10 +25,30 @@ class BrainInterface(ABC):
     def score_game(self, jogo: List[int], context: Dict[str, Any]) -> float:
         """score interno (comparativo)"""
 
+    def score_batch(self, jogos_2d: np.ndarray, context: Dict[str, Any]) -> np.ndarray:
+        """score_game para uma matriz (n, size) de jogos; cérebros podem vetorizar"""
+        return np.fromiter(
+            (float(self.score_game([int(d) for d in row], context)) for row in jogos_2d),
+            dtype=np.float64,
+            count=len(jogos_2d),
+        )
+
     @abstractmethod
     def learn(self, concurso_n: int, jogo: List[int], resultado_n1: List[int], pontos: int, context: Dict[str, Any]) -> None:
         """aprendizado incremental N->N+1"""
 
+    def learn_batch(
+        self,
+        concurso_n: int,
+        jogos: List[List[int]],
+        resultado_n1: List[int],
+        pontos: List[int],
+        context: Dict[str, Any],
+    ) -> None:
+        """learn para todos os jogos do cérebro num concurso (mesma ordem); cérebros podem vetorizar"""
+        for jogo, pts in zip(jogos, pontos):
+            self.learn(concurso_n, jogo, resultado_n1, pts, context)
+
     @abstractmethod
     def save_state(self) -> None:
         """salva estado no banco"""
@@ -10,14 +10,17 @@ import argparse
 import time
 import inspect
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
+import numpy as np
 from tqdm import tqdm
 
 from config.game import DIA_DE_SORTE_RULES
-from data.BD.connection import get_conn
+from data.BD.connection import close_conn, get_conn
+from training.core.base_brain import BaseBrain
+from training.brains._utils import dezenas_mask
 from training.core.brain_hub import BrainHub
-from training.utils.comparador import contar_acertos
 
 # Cluster atual (adicione mais brains aqui depois)
 from training.brains.statistical.freq_global_brain import StatFreqGlobalBrain
@@ -44,6 +47,89 @@ AVALIAR_TOP_K = 40                   # quantos avaliar por tamanho (custo contro
 SALVAR_MEMORIA_MIN = DIA_DE_SORTE_RULES.memoria_min_acertos
 PERSISTIR_A_CADA = 5                 # salva estados + checkpoint a cada X concursos
 SCORE_TAG = "trainer_v2_hub"         # tag para auditoria
+CACHE_SQLITE_MB = 128                # page cache da conexão do treino (muitas leituras/escritas pequenas)
+
+# regras fixas do jogo lidas uma vez (o loop de treino não paga lookup de atributo)
+_UNIVERSO_MAX = DIA_DE_SORTE_RULES.universo_max
+_JOGO_MIN = DIA_DE_SORTE_RULES.jogo_min_dezenas
+_JOGO_MAX = DIA_DE_SORTE_RULES.jogo_max_dezenas
+_TAMANHOS = tuple(range(_JOGO_MIN, _JOGO_MAX + 1))
+_DEZENAS = tuple(range(1, _UNIVERSO_MAX + 1))
+
+# deslocamentos para abrir máscara de bits em matriz indicadora (coluna d = dezena d)
+_DEZENA_BITS = np.arange(_UNIVERSO_MAX + 1, dtype=np.int64)
+# padding das colunas d1..d15 que o jogo não usa
+_DEZENAS_PAD: Tuple[None, ...] = (None,) * _JOGO_MAX
+
+
+# ==========================
+# SQL (montado uma vez: mesma string -> cache de statements do sqlite3 acerta)
+# ==========================
+_TENTATIVA_COLS = (
+    "concurso_n", "concurso_n1", "tipo_jogo", "tentativa",
+    "d1", "d2", "d3", "d4", "d5", "d6", "d7", "d8", "d9", "d10", "d11", "d12", "d13", "d14", "d15",
+    "acertos", "score", "score_tag", "brain_id", "tempo_exec", "timestamp",
+)
+_MEMORIA_COLS = (
+    "concurso_n", "concurso_n1", "tipo_jogo",
+    "d1", "d2", "d3", "d4", "d5", "d6", "d7", "d8", "d9", "d10", "d11", "d12", "d13", "d14", "d15",
+    "acertos", "peso", "origem", "timestamp",
+)
+# placeholders automáticos -> nunca mais dá mismatch
+_TENTATIVA_INSERT_SQL = (
+    f"INSERT INTO tentativas ({','.join(_TENTATIVA_COLS)}) "
+    f"VALUES ({','.join(['?'] * len(_TENTATIVA_COLS))})"
+)
+_MEMORIA_INSERT_SQL = (
+    f"INSERT OR IGNORE INTO memoria_jogos ({','.join(_MEMORIA_COLS)}) "
+    f"VALUES ({','.join(['?'] * len(_MEMORIA_COLS))})"
+)
+_RESULT_SQL = """
+SELECT d1,d2,d3,d4,d5,d6,d7
+FROM concursos
+WHERE concurso=?
+"""
+# últimos N até o concurso, já em ordem crescente (subquery DESC LIMIT + ORDER BY externo)
+_RECENT_RESULTS_SQL = """
+SELECT d1,d2,d3,d4,d5,d6,d7
+FROM (
+    SELECT concurso,d1,d2,d3,d4,d5,d6,d7
+    FROM concursos
+    WHERE concurso <= ?
+    ORDER BY concurso DESC
+    LIMIT ?
+)
+ORDER BY concurso ASC
+"""
+# penúltimo concurso do banco = último com N+1 conhecido (usa o índice UNIQUE, sem varrer a tabela)
+_MAX_TREINO_SQL = "SELECT concurso FROM concursos ORDER BY concurso DESC LIMIT 1 OFFSET 1"
+_PENDENTES_SQL = """
+SELECT concurso
+FROM concursos
+WHERE concurso > ? AND concurso <= ?
+ORDER BY concurso ASC
+LIMIT ?
+"""
+# histórico do treino inteiro numa consulta: janela antes do 1º pendente até o N+1 do último
+_HISTORICO_TREINO_SQL = """
+SELECT concurso,d1,d2,d3,d4,d5,d6,d7
+FROM concursos
+WHERE concurso <= ?
+  AND concurso >= COALESCE(
+      (SELECT MIN(concurso) FROM (
+          SELECT concurso FROM concursos WHERE concurso <= ? ORDER BY concurso DESC LIMIT ?
+      )), 0)
+ORDER BY concurso ASC
+"""
+_CHECKPOINT_GET_SQL = "SELECT ultimo_concurso_processado FROM checkpoint WHERE id=1"
+_CHECKPOINT_SET_SQL = """
+INSERT INTO checkpoint (id, ultimo_concurso_processado, etapa, timestamp)
+VALUES (1, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    ultimo_concurso_processado=excluded.ultimo_concurso_processado,
+    etapa=excluded.etapa,
+    timestamp=excluded.timestamp
+"""
 
 
 # ==========================
@@ -60,6 +146,18 @@ def _log(msg: str) -> None:
 # ==========================
 # COMMIT AUTOMATICO ACTIONS
 # ==========================
+@lru_cache(maxsize=1)
+def _commit_if_good_main() -> Optional[Callable[[], None]]:
+    """
+    scripts.commit_if_good.main importado uma vez (None se não der: cai no subprocess).
+    """
+    try:
+        from scripts.commit_if_good import main as commit_if_good_main
+    except Exception:
+        return None
+    return commit_if_good_main
+
+
 def _try_commit_if_good_every(
     last_ts: float,
     interval_min: int = 30,
@@ -81,6 +179,20 @@ def _try_commit_if_good_every(
     if (now - last_ts) < (interval_min * 60):
         return last_ts
 
+    # no mesmo processo: evita subir um Python novo (e reimportar o repo) a cada rodada
+    commit_main = _commit_if_good_main()
+    if commit_main is not None:
+        _log("🧾 Tentando commit automático (commit_if_good)...")
+        try:
+            commit_main()
+        except SystemExit as e:
+            # o script sinaliza falha de push com SystemExit
+            if e.code:
+                _log(f"⚠️ commit_if_good terminou com código {e.code}")
+        except Exception as e:
+            _log(f"⚠️ Falha ao tentar commit automático: {e}")
+        return now
+
     try:
         root = Path(__file__).resolve().parents[1]  # raiz do repo
         script = root / "scripts" / "commit_if_good.py"
@@ -107,46 +219,60 @@ def _fetch_all_concursos(conn) -> List[int]:
     return [int(r[0]) for r in cur.fetchall()]
 
 
+def _fetch_max_treino(conn) -> Optional[int]:
+    """
+    Maior concurso treinável (o penúltimo do banco); None se houver menos de 2 concursos.
+    """
+    cur = conn.cursor()
+    cur.execute(_MAX_TREINO_SQL)
+    row = cur.fetchone()
+    return int(row[0]) if row else None
+
+
+def _fetch_pendentes(conn, checkpoint: int, max_treino: int, limite: Optional[int] = None) -> List[int]:
+    """
+    Concursos em (checkpoint, max_treino], em ordem; limite None = todos.
+    """
+    cur = conn.cursor()
+    cur.execute(_PENDENTES_SQL, (int(checkpoint), int(max_treino), -1 if limite is None else int(limite)))
+    return [r[0] for r in cur.fetchall()]
+
+
 def _fetch_result(conn, concurso: int) -> Optional[List[int]]:
     cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT d1,d2,d3,d4,d5,d6,d7
-        FROM concursos
-        WHERE concurso=?
-        """,
-        (int(concurso),),
-    )
+    cur.execute(_RESULT_SQL, (int(concurso),))
     row = cur.fetchone()
     if not row:
         return None
     return [int(x) for x in row]
 
 
-def _fetch_recent_results(conn, concurso_n: int, janela: int) -> List[List[int]]:
+def _fetch_recent_results(conn, concurso_n: int, janela: int) -> np.ndarray:
     """
-    Retorna lista de resultados [ [7], [7], ... ] dos concursos <= concurso_n
-    com tamanho máximo = janela (do mais antigo ao mais novo).
+    Retorna matriz (n, 7) de resultados dos concursos <= concurso_n
+    com n máximo = janela (do mais antigo ao mais novo).
     """
     cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT d1,d2,d3,d4,d5,d6,d7
-        FROM concursos
-        WHERE concurso <= ?
-        ORDER BY concurso DESC
-        LIMIT ?
-        """,
-        (int(concurso_n), int(janela)),
-    )
-    rows = cur.fetchall()
-    rows = list(reversed(rows))
-    return [[int(x) for x in r] for r in rows]
+    cur.arraysize = max(1, int(janela))
+    cur.execute(_RECENT_RESULTS_SQL, (int(concurso_n), int(janela)))
+    return np.asarray(cur.fetchall(), dtype=np.int8).reshape(-1, 7)
+
+
+def _fetch_historico_treino(conn, primeiro: int, ultimo: int, janela: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Resultados de que o treino de [primeiro, ultimo] precisa, de uma vez:
+    a janela até `primeiro` + tudo até ultimo+1 (o N+1 do último pendente).
+    Retorna (concursos (n,), dezenas (n, 7)) em ordem crescente.
+    """
+    cur = conn.cursor()
+    cur.execute(_HISTORICO_TREINO_SQL, (int(ultimo) + 1, int(primeiro), int(janela)))
+    rows = np.asarray(cur.fetchall(), dtype=np.int64).reshape(-1, 8)
+    return rows[:, 0], rows[:, 1:].astype(np.int8)
 
 
 def _get_checkpoint(conn) -> int:
     cur = conn.cursor()
-    cur.execute("SELECT ultimo_concurso_processado FROM checkpoint WHERE id=1")
+    cur.execute(_CHECKPOINT_GET_SQL)
     row = cur.fetchone()
     if not row or row[0] is None:
         return 0
@@ -160,120 +286,72 @@ def _set_checkpoint(
     commit: bool = True,
 ) -> None:
     cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO checkpoint (id, ultimo_concurso_processado, etapa, timestamp)
-        VALUES (1, ?, ?, ?)
-        ON CONFLICT(id) DO UPDATE SET
-            ultimo_concurso_processado=excluded.ultimo_concurso_processado,
-            etapa=excluded.etapa,
-            timestamp=excluded.timestamp
-        """,
-        (int(ultimo_concurso), str(etapa), now_str()),
-    )
+    cur.execute(_CHECKPOINT_SET_SQL, (int(ultimo_concurso), str(etapa), now_str()))
     if commit:
         conn.commit()
 
 
-def _insert_tentativa(
-    conn,
+def _tentativa_row(
     concurso_n: int,
     concurso_n1: int,
     tipo_jogo: int,
     tentativa: int,
-    dezenas: List[int],
+    dezenas_sql: Tuple[Optional[int], ...],
     acertos: int,
     score: float,
     brain_id: str,
     tempo_exec: float,
-    commit: bool = True,
-) -> None:
+    timestamp: str,
+) -> Tuple[Any, ...]:
     """
-    Insere em tentativas no formato d1..d15 (7..15)
-    (corrigido: placeholders automáticos -> nunca mais dá mismatch)
+    Linha de tentativas na ordem de _TENTATIVA_COLS.
+    dezenas_sql já vem ordenado e com padding até d15 (ver _rank_and_select).
     """
-    dezenas_sorted = sorted(int(x) for x in dezenas)
-    payload = dezenas_sorted + [None] * (DIA_DE_SORTE_RULES.jogo_max_dezenas - len(dezenas_sorted))
-
-    cols = [
-        "concurso_n", "concurso_n1", "tipo_jogo", "tentativa",
-        "d1", "d2", "d3", "d4", "d5", "d6", "d7", "d8", "d9", "d10", "d11", "d12", "d13", "d14", "d15",
-        "acertos", "score", "score_tag", "brain_id", "tempo_exec", "timestamp",
-    ]
-
-    values = [
-        int(concurso_n),
-        int(concurso_n1),
-        int(tipo_jogo),
-        int(tentativa),
-        payload[0], payload[1], payload[2], payload[3], payload[4],
-        payload[5], payload[6], payload[7], payload[8], payload[9],
-        payload[10], payload[11], payload[12], payload[13], payload[14],
-        int(acertos),
-        float(score),
-        SCORE_TAG,
-        str(brain_id),
-        float(tempo_exec),
-        now_str(),
-    ]
-
-    placeholders = ",".join(["?"] * len(values))
-    sql = f"INSERT INTO tentativas ({','.join(cols)}) VALUES ({placeholders})"
+    return (concurso_n, concurso_n1, tipo_jogo, tentativa) + dezenas_sql + (
+        acertos, score, SCORE_TAG, brain_id, tempo_exec, timestamp,
+    )
 
+
+def _insert_tentativas_batch(conn, rows: Iterable[Tuple[Any, ...]]) -> None:
+    """
+    Insere as tentativas do concurso num executemany só (sem commit: quem chama fecha a transação).
+    rows pode ser um gerador: as linhas vão direto para o driver, sem lista intermediária.
+    """
     cur = conn.cursor()
-    cur.execute(sql, values)
-    if commit:
-        conn.commit()
+    cur.executemany(_TENTATIVA_INSERT_SQL, rows)
 
 
-def _insert_memoria_forte(
-    conn,
+def _memoria_row(
     concurso_n: int,
     concurso_n1: int,
     tipo_jogo: int,
-    dezenas: List[int],
+    dezenas_sql: Tuple[Optional[int], ...],
     acertos: int,
     peso: float,
     origem: str,
-    commit: bool = True,
-) -> bool:
+    timestamp: str,
+) -> Optional[Tuple[Any, ...]]:
     """
-    Salva memoria_jogos (>= SALVAR_MEMORIA_MIN) usando INSERT OR IGNORE
-    (corrigido: placeholders automáticos)
+    Linha de memoria_jogos (só se acertos >= SALVAR_MEMORIA_MIN), na ordem de _MEMORIA_COLS
     """
-    if int(acertos) < int(SALVAR_MEMORIA_MIN):
-        return False
-
-    dezenas_sorted = sorted(int(x) for x in dezenas)
-    payload = dezenas_sorted + [None] * (DIA_DE_SORTE_RULES.jogo_max_dezenas - len(dezenas_sorted))
-
-    cols = [
-        "concurso_n", "concurso_n1", "tipo_jogo",
-        "d1", "d2", "d3", "d4", "d5", "d6", "d7", "d8", "d9", "d10", "d11", "d12", "d13", "d14", "d15",
-        "acertos", "peso", "origem", "timestamp",
-    ]
-
-    values = [
-        int(concurso_n),
-        int(concurso_n1),
-        int(tipo_jogo),
-        payload[0], payload[1], payload[2], payload[3], payload[4],
-        payload[5], payload[6], payload[7], payload[8], payload[9],
-        payload[10], payload[11], payload[12], payload[13], payload[14],
-        int(acertos),
-        float(peso),
-        str(origem),
-        now_str(),
-    ]
-
-    placeholders = ",".join(["?"] * len(values))
-    sql = f"INSERT OR IGNORE INTO memoria_jogos ({','.join(cols)}) VALUES ({placeholders})"
+    if acertos < SALVAR_MEMORIA_MIN:
+        return None
+
+    return (concurso_n, concurso_n1, tipo_jogo) + dezenas_sql + (acertos, peso, origem, timestamp)
+
+
+def _insert_memorias_batch(conn, rows: List[Tuple[Any, ...]]) -> int:
+    """
+    Salva memoria_jogos com INSERT OR IGNORE num executemany só (sem commit).
+    Retorna quantas linhas entraram de fato.
+    """
+    if not rows:
+        return 0
 
     cur = conn.cursor()
-    cur.execute(sql, values)
-    if commit:
-        conn.commit()
-    return cur.rowcount > 0
+    cur.executemany(_MEMORIA_INSERT_SQL, rows)
+    # executemany soma as linhas afetadas; as ignoradas não contam
+    return max(0, cur.rowcount)
 
 
 def _build_context(conn, concurso_n: int, janela_recente: int) -> Dict[str, Any]:
@@ -284,13 +362,30 @@ def _build_context(conn, concurso_n: int, janela_recente: int) -> Dict[str, Any]
     - historico_recente (lista de resultados até N)
     - freq_recente (dict)
     """
-    historico = _fetch_recent_results(conn, concurso_n=concurso_n, janela=janela_recente)
-    ultimo = historico[-1] if historico else (_fetch_result(conn, concurso_n) or [])
+    hist_arr = _fetch_recent_results(conn, concurso_n=concurso_n, janela=janela_recente)
+    if not len(hist_arr):
+        hist_arr = np.asarray([_fetch_result(conn, concurso_n) or []], dtype=np.int8).reshape(-1, 7)
+    return _context_from_historico(concurso_n, hist_arr, janela_recente)
+
+
+def _context_from_historico(
+    concurso_n: int,
+    hist_arr: np.ndarray,
+    janela_recente: int,
+    freq_arr: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Mesmo contexto de _build_context, a partir da matriz (n, 7) já carregada (sem SQLite).
+    freq_arr: contagem por dezena da janela, se quem chama já mantém (senão, bincount aqui).
+    """
+    # cérebros recebem listas puras (usam `or []`); tolist converte tudo em C
+    historico: List[List[int]] = hist_arr.tolist()
+    ultimo = historico[-1] if historico else []
 
-    freq: Dict[int, int] = {i: 0 for i in range(1, DIA_DE_SORTE_RULES.universo_max + 1)}
-    for r in historico:
-        for d in r:
-            freq[int(d)] += 1
+    # freq numa passada só (bincount); dict só na fronteira com o Hub
+    if freq_arr is None:
+        freq_arr = np.bincount(hist_arr.ravel(), minlength=_UNIVERSO_MAX + 1)
+    freq: Dict[int, int] = dict(zip(_DEZENAS, freq_arr[1:_UNIVERSO_MAX + 1].tolist()))
 
     return {
         "concurso_n": int(concurso_n),
@@ -308,26 +403,49 @@ def _rank_and_select(
     tipo: int,
 ) -> List[Dict[str, Any]]:
     top = candidatos[: int(avaliar_top_k)]
+    if not top:
+        return []
+
+    # matriz indicadora (K, universo+1) a partir das máscaras do Hub: acertos = um produto matriz-vetor
+    masks = np.fromiter((c.get("mask") or dezenas_mask(c["jogo"]) for c in top), dtype=np.int64, count=len(top))
+    jogos_mat = (masks[:, None] >> _DEZENA_BITS) & 1
+    resultado_vec = np.zeros(_DEZENA_BITS.size, dtype=np.int64)
+    resultado_vec[np.asarray(resultado_n1, dtype=np.int64)] = 1
+    acertos = jogos_mat @ resultado_vec
+    scores = np.fromiter((float(c.get("score", 0.0)) for c in top), dtype=np.float64, count=len(top))
+
+    # (acertos, score) decrescente; empate mantém a ordem do Hub (igual ao sort estável com reverse)
+    order = np.lexsort((np.arange(len(top)), -scores, -acertos))
+
+    ac_list = acertos.tolist()
+    sc_list = scores.tolist()
     avaliados: List[Dict[str, Any]] = []
-    for c in top:
-        jogo = [int(x) for x in c["jogo"]]
-        ac = contar_acertos(jogo, resultado_n1)
+    for i in order.tolist():
+        c = top[i]
+        jogo = sorted(int(x) for x in c["jogo"])
         avaliados.append(
             {
-                "jogo": sorted(jogo),
-                "acertos": int(ac),
-                "score": float(c.get("score", 0.0)),
+                "jogo": jogo,
+                # d1..d15 prontos para o INSERT: ordena e completa com None uma vez por candidato
+                "dezenas_sql": tuple(jogo) + _DEZENAS_PAD[len(jogo):],
+                "acertos": ac_list[i],
+                "score": sc_list[i],
                 "brain_id": str(c.get("brain_id", "unknown")),
                 "tipo": int(tipo),
             }
         )
-    avaliados.sort(key=lambda x: (x["acertos"], x["score"]), reverse=True)
     return avaliados
 
 
 # =========================================================
 # ✅ INSTANCIAÇÃO ROBUSTA DE CÉREBROS (RESOLVE SEU ERRO)
 # =========================================================
+@lru_cache(maxsize=None)
+def _accepted_kwargs(brain_cls) -> frozenset:
+    # parâmetros do __init__ (inclui self): reflexão uma vez por classe
+    return frozenset(inspect.signature(brain_cls.__init__).parameters)
+
+
 def _instantiate_brain(brain_cls, conn, **kwargs):
     """
     Instancia qualquer cérebro de forma segura:
@@ -336,8 +454,7 @@ def _instantiate_brain(brain_cls, conn, **kwargs):
     - evita quebrar o trainer quando o cérebro não tem o argumento
     """
     try:
-        sig = inspect.signature(brain_cls.__init__)
-        accepted = set(sig.parameters.keys())  # inclui self
+        accepted = _accepted_kwargs(brain_cls)
         filtered = {k: v for k, v in kwargs.items() if k in accepted}
         return brain_cls(conn, **filtered)
     except TypeError:
@@ -363,17 +480,14 @@ def treinar_pendencias(
     steps_delta_max: int = 3,
     steps_wrap_mode: str = "wrap",
     steps_max_attempts_per_game: int = 50,
+    workers: int = 0,
 ) -> Dict[str, Any]:
-    concursos = _fetch_all_concursos(conn)
-    if len(concursos) < 2:
+    max_treino = _fetch_max_treino(conn)
+    if max_treino is None:
         raise RuntimeError("❌ Banco tem poucos concursos. Rode START/startBD.py e/ou START/update_concursos.py.")
 
     ck = _get_checkpoint(conn)
-    max_treino = concursos[-2]
-    pendentes = [c for c in concursos if c > ck and c <= max_treino]
-
-    if limite_concursos is not None:
-        pendentes = pendentes[: int(limite_concursos)]
+    pendentes = _fetch_pendentes(conn, ck, max_treino, limite_concursos)
 
     if not pendentes:
         return {"status": "ok", "message": "Sem novos concursos para treinar.", "checkpoint": ck}
@@ -402,9 +516,14 @@ def treinar_pendencias(
         hub_kwargs["consensus_bonus"] = float(consensus_bonus)
     if consensus_min_votes is not None:
         hub_kwargs["consensus_min_votes"] = int(consensus_min_votes)
+    if workers:
+        hub_kwargs["n_workers"] = int(workers)
 
     hub = BrainHub(conn, **hub_kwargs)
 
+    # um SELECT em cerebros para todos; cada cérebro só insere se ainda não existir
+    BaseBrain.preload_registry(conn)
+
     # IMPORTANTÍSSIMO: usamos instanciação adaptativa (não quebra por kwargs)
     hub.register(_instantiate_brain(StatFreqGlobalBrain, conn))
     hub.register(_instantiate_brain(StatFreqRecenteBrain, conn, janela=120))
@@ -440,100 +559,154 @@ def treinar_pendencias(
     total_6 = 0
     total_7 = 0
 
-    pbar = tqdm(pendentes, desc="Treinando concursos", unit="concurso")
+    # todos os resultados do treino numa consulta só: N+1 e janelas saem da memória
+    hist_concursos, hist_dezenas = _fetch_historico_treino(conn, pendentes[0], pendentes[-1], JANELA_RECENTE)
+    hist_lista = hist_dezenas.tolist()
+    pos_by_concurso: Dict[int, int] = {c: i for i, c in enumerate(hist_concursos.tolist())}
+    resultados_by_concurso: Dict[int, List[int]] = {c: hist_lista[i] for c, i in pos_by_concurso.items()}
+    # janela atual [jan_ini, jan_fim) em hist_dezenas e sua contagem por dezena
+    freq_janela = np.zeros(_UNIVERSO_MAX + 1, dtype=np.int64)
+    jan_ini = jan_fim = 0
+    # checkpoint fica em memória e vai ao banco só junto de cada commit
+    ultimo_processado: Optional[int] = None
+
+    pbar = tqdm(pendentes, desc="Treinando concursos", unit="concurso", mininterval=0.5)
     t0_global = time.time()
     last_commit_ts = time.time()
 
-    for idx, concurso_n in enumerate(pbar, 1):
-        resultado_n1 = _fetch_result(conn, concurso_n + 1)
-        if not resultado_n1:
-            continue
-
-        context_base = _build_context(conn, concurso_n=concurso_n, janela_recente=JANELA_RECENTE)
-
-        tentativa = 1
-        t0 = time.time()
-
-        top_por_tamanho: List[Dict[str, Any]] = []
-        for tamanho in range(DIA_DE_SORTE_RULES.jogo_min_dezenas, DIA_DE_SORTE_RULES.jogo_max_dezenas + 1):
-            candidatos = hub.generate_games(
-                context=context_base,
-                size=tamanho,
-                per_brain=CANDIDATOS_POR_CEREBRO,
-                top_n=TOP_N_POR_TAMANHO,
-            )
-            top_por_tamanho.extend(_rank_and_select(candidatos, resultado_n1, AVALIAR_TOP_K, tipo=tamanho))
-
-        tempo_exec = time.time() - t0
-
-        # --------------------------
-        # Persistência + aprendizado
-        # --------------------------
-        for item in top_por_tamanho:
-            jogo = item["jogo"]
-            acertos = item["acertos"]
-            score = item["score"]
-            brain_id = item["brain_id"]
-            tipo = item["tipo"]
-
-            _insert_tentativa(
-                conn,
-                concurso_n=concurso_n,
-                concurso_n1=concurso_n + 1,
-                tipo_jogo=tipo,
-                tentativa=tentativa,
-                dezenas=jogo,
-                acertos=acertos,
-                score=score,
-                brain_id=brain_id,
-                tempo_exec=tempo_exec,
-                commit=False,
-            )
-
-            if acertos >= SALVAR_MEMORIA_MIN:
-                ok = _insert_memoria_forte(
+    # uma transação longa: commit só a cada PERSISTIR_A_CADA concursos, junto com o save dos cérebros
+    # hold_commits: autosave/flush dos cérebros só escrevem; o commit é sempre o do lote abaixo
+    # (checkpoint + linhas do treino + estado ficam sempre alinhados; em erro volta ao último commit)
+    try:
+        with BaseBrain.hold_commits(conn):
+            for idx, concurso_n in enumerate(pbar, 1):
+                resultado_n1 = resultados_by_concurso.get(concurso_n + 1)
+                if not resultado_n1:
+                    continue
+
+                # janela = últimas JANELA_RECENTE linhas com concurso <= N (fatia da matriz, sem SQL)
+                fim = pos_by_concurso[concurso_n] + 1
+                ini = max(0, fim - JANELA_RECENTE)
+                hist_arr = hist_dezenas[ini:fim]
+
+                # freq deslizante: tira as linhas que saíram da janela e soma as que entraram (O(7) por passo)
+                if ini < jan_ini or ini >= jan_fim:
+                    freq_janela = np.bincount(hist_arr.ravel(), minlength=_UNIVERSO_MAX + 1)
+                else:
+                    np.subtract.at(freq_janela, hist_dezenas[jan_ini:ini].ravel(), 1)
+                    np.add.at(freq_janela, hist_dezenas[jan_fim:fim].ravel(), 1)
+                jan_ini, jan_fim = ini, fim
+
+                context_base = _context_from_historico(concurso_n, hist_arr, JANELA_RECENTE, freq_arr=freq_janela)
+
+                t0 = time.time()
+
+                # todos os tamanhos numa chamada só ao Hub (relevância uma vez; pool recebe tudo junto)
+                candidatos_por_tamanho = hub.generate_games_multisize(
+                    context=context_base,
+                    sizes=_TAMANHOS,
+                    per_brain=CANDIDATOS_POR_CEREBRO,
+                    top_n=TOP_N_POR_TAMANHO,
+                )
+                top_por_tamanho: List[Dict[str, Any]] = []
+                for tamanho, candidatos in candidatos_por_tamanho.items():
+                    top_por_tamanho.extend(_rank_and_select(candidatos, resultado_n1, AVALIAR_TOP_K, tipo=tamanho))
+
+                tempo_exec = time.time() - t0
+
+                # --------------------------
+                # Persistência + aprendizado
+                # --------------------------
+                # linhas do concurso gravadas em lote (executemany) numa transação só;
+                # timestamp único por concurso (a tabela não precisa de precisão por linha)
+                ts_concurso = now_str()
+                memoria_rows: List[Tuple[Any, ...]] = []
+                memoria_vistas: Set[Tuple[Optional[int], ...]] = set()
+                # (brain_id, jogo, pontos): aprendizado do concurso vai ao Hub numa chamada só
+                learn_itens: List[Tuple[str, List[int], int]] = []
+
+                for item in top_por_tamanho:
+                    jogo = item["jogo"]
+                    acertos = item["acertos"]
+                    brain_id = item["brain_id"]
+                    tipo = item["tipo"]
+
+                    # mesmo jogo (tipo + dezenas) já entrou neste concurso -> nem vai ao INSERT OR IGNORE
+                    if acertos >= SALVAR_MEMORIA_MIN and item["dezenas_sql"] not in memoria_vistas:
+                        memoria_vistas.add(item["dezenas_sql"])
+                        row = _memoria_row(
+                            concurso_n=concurso_n,
+                            concurso_n1=concurso_n + 1,
+                            tipo_jogo=tipo,
+                            dezenas_sql=item["dezenas_sql"],
+                            acertos=acertos,
+                            peso=1.0,
+                            origem=f"{SCORE_TAG}:{brain_id}",
+                            timestamp=ts_concurso,
+                        )
+                        if row is not None:
+                            memoria_rows.append(row)
+
+                    if acertos >= 6:
+                        total_6 += 1
+                    if acertos == 7:
+                        total_7 += 1
+
+                    learn_itens.append((brain_id, jogo, acertos))
+
+                # tentativas + memórias entram na transação aberta (commit abaixo) antes do learn:
+                # StatEliteMemoryBrain.learn sincroniza memoria_jogos e precisa ver as linhas deste concurso
+                _insert_tentativas_batch(
                     conn,
-                    concurso_n=concurso_n,
-                    concurso_n1=concurso_n + 1,
-                    tipo_jogo=tipo,
-                    dezenas=jogo,
-                    acertos=acertos,
-                    peso=1.0,
-                    origem=f"{SCORE_TAG}:{brain_id}",
-                    commit=False,
+                    (
+                        _tentativa_row(
+                            concurso_n=concurso_n,
+                            concurso_n1=concurso_n + 1,
+                            tipo_jogo=item["tipo"],
+                            tentativa=tentativa,
+                            dezenas_sql=item["dezenas_sql"],
+                            acertos=item["acertos"],
+                            score=item["score"],
+                            brain_id=item["brain_id"],
+                            tempo_exec=tempo_exec,
+                            timestamp=ts_concurso,
+                        )
+                        for tentativa, item in enumerate(top_por_tamanho, 1)
+                    ),
                 )
-                if ok:
-                    total_mem += 1
-
-            if acertos >= 6:
-                total_6 += 1
-            if acertos == 7:
-                total_7 += 1
-
-            hub.learn(
-                concurso_n=concurso_n,
-                jogo=jogo,
-                resultado_n1=resultado_n1,
-                pontos=acertos,
-                context=context_base,
-                brain_id=brain_id,
-            )
-
-            tentativa += 1
+                total_mem += _insert_memorias_batch(conn, memoria_rows)
 
-        _set_checkpoint(conn, concurso_n, etapa="trainer_v2", commit=False)
-        conn.commit()
+                hub.learn_batch(
+                    concurso_n=concurso_n,
+                    itens=learn_itens,
+                    resultado_n1=resultado_n1,
+                    context=context_base,
+                )
+                ultimo_processado = concurso_n
 
-        if idx % int(PERSISTIR_A_CADA) == 0:
-            hub.save_all()
+                if idx % int(PERSISTIR_A_CADA) == 0:
+                    # só o último checkpoint do lote importa: uma escrita por commit
+                    _set_checkpoint(conn, ultimo_processado, etapa="trainer_v2", commit=False)
+                    hub.save_all()
+                    conn.commit()
 
-        # ✅ tenta commit a cada ~29 min (só no GitHub Actions)
-        last_commit_ts = _try_commit_if_good_every(last_commit_ts, interval_min=29)
+                # ✅ tenta commit a cada ~29 min (só no GitHub Actions)
+                last_commit_ts = _try_commit_if_good_every(last_commit_ts, interval_min=29)
 
-        melhor = top_por_tamanho[0]["acertos"] if top_por_tamanho else 0
-        pbar.set_postfix({"melhor": melhor, "mem+": total_mem, "6+": total_6, "7": total_7})
+                melhor = top_por_tamanho[0]["acertos"] if top_por_tamanho else 0
+                # refresh=False: só atualiza o texto; o tqdm redesenha no próprio ritmo (mininterval)
+                pbar.set_postfix_str(f"melhor={melhor}, mem+={total_mem}, 6+={total_6}, 7={total_7}", refresh=False)
 
-    hub.save_all()
+            if ultimo_processado is not None:
+                _set_checkpoint(conn, ultimo_processado, etapa="trainer_v2", commit=False)
+            hub.save_all()
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # encerra os processos do pool (--workers), se o Hub chegou a abrir
+        hub.close()
 
     dur = time.time() - t0_global
     resumo = {
@@ -575,15 +748,18 @@ def run(
     steps_delta_max: int,
     steps_wrap_mode: str,
     steps_max_attempts_per_game: int,
+    workers: int = 0,
 ) -> None:
     """
     Modo 24/7:
     - roda treinos pendentes
     - se não tiver novos concursos, dorme e repete
     """
-    while True:
-        conn = get_conn()
-        try:
+    # conexão única pelo processo inteiro: page cache e statement cache do SQLite
+    # continuam quentes entre um ciclo e outro do --loop
+    conn = get_conn(cache_mb=CACHE_SQLITE_MB)
+    try:
+        while True:
             resumo = treinar_pendencias(
                 conn,
                 limite_concursos=limite_concursos,
@@ -599,21 +775,22 @@ def run(
                 steps_delta_max=steps_delta_max,
                 steps_wrap_mode=steps_wrap_mode,
                 steps_max_attempts_per_game=steps_max_attempts_per_game,
+                workers=workers,
             )
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
 
-        if not loop:
-            break
+            if not loop:
+                break
 
-        if resumo.get("message") == "Sem novos concursos para treinar.":
-            _log(f"🕒 Sem novos concursos. Dormindo {sleep_min} min...")
-            time.sleep(max(1, int(sleep_min)) * 60)
-        else:
-            time.sleep(2)
+            if resumo.get("message") == "Sem novos concursos para treinar.":
+                _log(f"🕒 Sem novos concursos. Dormindo {sleep_min} min...")
+                time.sleep(max(1, int(sleep_min)) * 60)
+            else:
+                time.sleep(2)
+    finally:
+        try:
+            close_conn(conn)
+        except Exception:
+            pass
 
 
 def main() -> None:
@@ -642,6 +819,12 @@ def main() -> None:
         default=50,
         help="Tentativas por jogo no brain de step sequences.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Processos para o generate dos cérebros em paralelo (0 = sequencial).",
+    )
 
     args = parser.parse_args()
 
@@ -661,6 +844,7 @@ def main() -> None:
         steps_delta_max=int(args.steps_delta_max),
         steps_wrap_mode=str(args.steps_wrap_mode),
         steps_max_attempts_per_game=int(args.steps_max_attempts_per_game),
+        workers=max(0, int(args.workers)),
     )
 
 